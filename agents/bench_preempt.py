@@ -0,0 +1,74 @@
+"""Check emergency preemption against its latency budget
+
+Sends preemptions for alternating approaches to a running controller and fails (exit code 1) when the
+p99 time until every head confirmed the corridor is over budget, or when any head never confirmed.
+
+    ./run.sh                                   # controller and light host
+    python bench_preempt.py --requests 50 --budget-ms 250
+"""
+import argparse
+import json
+import sys
+import time
+import urllib.request
+
+from latency import percentile
+from planner import DIRECTIONS
+
+
+def post(url: str, payload: dict, timeout: float) -> dict:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+def summarize(values):
+    return {"p50_ms": round(percentile(values, 50), 2), "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(max(values), 2) if values else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emergency preemption latency budget check")
+    parser.add_argument('--url', default="http://localhost:5052/preempt")
+    parser.add_argument('--intersection', default=None, help="defaults to the controller's default intersection")
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=0.2, help="seconds between preemptions")
+    parser.add_argument('--budget-ms', type=float, default=250.0)
+    parser.add_argument('--output', default=None, help="write the JSON result here")
+    args = parser.parse_args()
+
+    round_trip, confirm, dispatch = [], [], []
+    unconfirmed = 0
+    for index in range(args.requests):
+        payload = {"approach": DIRECTIONS[index % len(DIRECTIONS)], "detected_at": time.time()}
+        if args.intersection:
+            payload["intersection"] = args.intersection
+        started = time.perf_counter()
+        reply = post(args.url, payload, timeout=10)
+        round_trip.append((time.perf_counter() - started) * 1000)
+        dispatch.append(reply.get("dispatch_ms") or 0.0)
+        if reply.get("confirm_ms") is None:
+            unconfirmed += 1
+        else:
+            confirm.append(reply["confirm_ms"])
+        time.sleep(args.interval)
+
+    result = {
+        "requests": args.requests,
+        "budget_ms": args.budget_ms,
+        "unconfirmed": unconfirmed,
+        "round_trip": summarize(round_trip),
+        "dispatch": summarize(dispatch),
+        "confirm": summarize(confirm),
+    }
+    result["passed"] = unconfirmed == 0 and result["confirm"]["p99_ms"] <= args.budget_ms
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    sys.exit(0 if result["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
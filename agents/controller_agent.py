@@ -1,55 +1,196 @@
 from uagents import Agent, Context, Model
+import asyncio
 import time
-from typing import Any, Dict
-import google.generativeai as genai
-import json
+import uuid
+from typing import Any, Dict, List
 from dotenv import load_dotenv
 import os
 
-# Load environment variables and configure Gemini
+from decision_cache import DecisionCache, normalize_situation
+from latency import LatencyWindow
+from light_state import LightStateStore, write_json_atomic
+from messages import ControllerMessage, LightAck, LocalFirstResolver
+from planner import (DIRECTIONS, SignalPlanner, StubModel, corridor_plan, format_plan, is_valid_plan,
+                     parse_situation, situation_from_metrics)
+from topology import known_endpoints, load_topology
+
+# Load environment variables
 load_dotenv()
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY not found in environment variables")
 
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-pro')
+# The rule planner decides every request it can; the LLM is only asked about situations it cannot read.
+#   gemini - ask Gemini (default when GOOGLE_API_KEY is set)
+#   stub   - ask the local StubModel, for running the controller offline
+#   off    - never ask, unreadable situations keep the current phase (default without a key)
+LLM_ADVISOR = os.getenv('LLM_ADVISOR', 'gemini' if GOOGLE_API_KEY else 'off')
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '3.0'))  # Seconds before the advisor is ignored
+# Advisor answers are reused for repeated situations until they expire
+DECISION_CACHE_SIZE = int(os.getenv('DECISION_CACHE_SIZE', '256'))
+DECISION_CACHE_TTL = float(os.getenv('DECISION_CACHE_TTL', '30.0'))
+LIGHT_ACK_TIMEOUT = float(os.getenv('LIGHT_ACK_TIMEOUT', '1.0'))  # Seconds to wait for each light to confirm
+LIGHT_STREAM_PORT = int(os.getenv('LIGHT_STREAM_PORT', '5054'))  # Server-Sent Events stream of light state
+LIGHT_STATE_PATH = os.getenv('LIGHT_STATE_PATH', 'light_state.json')  # Snapshot restored on restart
+# Camera-driven re-plans keep a phase at least this long, operator requests and emergencies are not held
+MIN_PHASE_SECONDS = float(os.getenv('MIN_PHASE_SECONDS', '10.0'))
+# Emergency preemption skips planning; every head has to confirm the corridor within the budget
+PREEMPT_BUDGET_MS = float(os.getenv('PREEMPT_BUDGET_MS', '250'))
+PREEMPT_HOLD_SECONDS = float(os.getenv('PREEMPT_HOLD_SECONDS', '30.0'))  # Camera re-plans wait this long
+
+if LLM_ADVISOR == 'gemini':
+    import google.generativeai as genai
+    if not GOOGLE_API_KEY:
+        raise ValueError("GOOGLE_API_KEY not found in environment variables")
+    genai.configure(api_key=GOOGLE_API_KEY)
+    model = genai.GenerativeModel('gemini-1.5-pro')
+elif LLM_ADVISOR == 'stub':
+    model = StubModel()
+else:
+    model = None
+
+planner = SignalPlanner()
+decision_cache = DecisionCache(max_entries=DECISION_CACHE_SIZE, ttl=DECISION_CACHE_TTL)
+# How each decision was made and how long it took, for /decision-stats
+decision_sources = {"planner": 0, "advisor": 0, "fallback": 0}
+decision_seconds = {"total": 0.0, "max": 0.0, "count": 0}
 
 # Define models
 class Request(Model):
     text: str
+    intersection: str = None  # Defaults to the topology's default intersection
 
 class Response(Model):
     message: str
-
-class ControllerMessage(Model):
-    text: str
-    color: str
-    turn_color: str = "red"  # Default to red for left turn
+    states: Dict[str, str] = {}
+    confirmed: List[str] = []
+    unconfirmed: List[str] = []
 
 class LightStatus(Model):
     color: str
     turn_color: str = None
 
+class ApproachMetrics(Model):
+    approach: str
+    camera: str = None
+    direction: str = None
+    vehicles: int = 0
+    queue_length: int = 0
+    occupancy: float = 0.0
+    arrival_rate: float = 0.0  # Vehicles per minute
+    detected_at: float  # Unix time of the detections behind these numbers
+
+class ApproachReport(Model):
+    intersection: str = None
+    sent_at: float
+    approaches: List[ApproachMetrics]
+
+class ApproachResponse(Model):
+    message: str
+    replanned: bool = False
+    states: Dict[str, str] = {}
+    confirmed: List[str] = []
+    unconfirmed: List[str] = []
+
+class PreemptRequest(Model):
+    approach: str  # Direction the emergency vehicle is coming from
+    intersection: str = None
+    corridor: List[str] = []  # Further intersections along its route, preempted at the same time
+    camera: str = None
+    track_id: int = None
+    score: float = None
+    detected_at: float = None  # Unix time of the detection, when it came from a camera
+
+class PreemptResponse(Model):
+    message: str
+    states: Dict[str, str] = {}
+    intersections: List[str] = []
+    confirmed: List[str] = []
+    unconfirmed: List[str] = []
+    dispatch_ms: float = 0.0  # Until every command was handed to the network
+    confirm_ms: float = None  # Until every head confirmed, None when some did not
+    detection_to_confirm_ms: float = None
+    within_budget: bool = False
+
+class PreemptStats(Model):
+    preemptions: int
+    over_budget: int
+    budget_ms: float
+    dispatch_p50_ms: float
+    dispatch_p99_ms: float
+    confirm_p50_ms: float
+    confirm_p99_ms: float
+    confirm_max_ms: float
+    detection_to_confirm_p50_ms: float
+    detection_to_confirm_p99_ms: float
+
+class SignalLatencyStats(Model):
+    reports: int
+    replans: int
+    held: int
+    unchanged: int
+    unconfirmed_changes: int
+    detection_to_controller_p50_ms: float
+    detection_to_controller_p99_ms: float
+    detection_to_signal_p50_ms: float
+    detection_to_signal_p99_ms: float
+    detection_to_signal_max_ms: float
+    signal_changes_measured: int
+
+class DecisionStats(Model):
+    cache_entries: int
+    cache_in_flight: int
+    cache_hits: int
+    cache_misses: int
+    cache_coalesced: int
+    cache_expired: int
+    cache_evicted: int
+    cache_failures: int
+    cache_hit_rate: float
+    advisor_avg_ms: float
+    advisor_max_ms: float
+    planner_decisions: int
+    advisor_decisions: int
+    fallback_decisions: int
+    decision_avg_ms: float
+    decision_max_ms: float
+
+# Intersections and the light agents at each of them, see topology.json
+intersections, default_intersection = load_topology()
+
 # Create the controller agent
 controller = Agent(
     name="controller",
     port=5052,  
     endpoint=["http://localhost:5052/submit"],
-    seed="controller recovery phrase"
+    seed="controller recovery phrase",
+    resolve=LocalFirstResolver(known_endpoints(intersections))
 )
 
-# Define the addresses of all traffic lights
-TRAFFIC_LIGHT_1_ADDRESS = "test-agent://agent1qdf25x66ck46vnu3lmra9q706ppvcz6g5pmwj58r98uzrsfcwkyw2xnjk9r"  # Northbound traffic
-TRAFFIC_LIGHT_2_ADDRESS = "test-agent://agent1qgqmfvwl4prsnhs53vfkyrnsvrhzys0ms5sz5vl0wvkzzvhhz4dhxhgr005"  # Eastbound traffic (can go straight or turn left)
-TRAFFIC_LIGHT_3_ADDRESS = "test-agent://agent1qtqwnanhgjjdezulfl27rlf3nnjs7a53nlgqwa7tjn4lmltyfkzkkgru0at"  # Westbound traffic (can only go straight)
+# command_id -> future resolved by the light's LightAck
+pending_acks: Dict[str, asyncio.Future] = {}
+# What the lights confirmed they show; the REST getters and the event stream read from here
+light_state = LightStateStore(intersections, snapshot_path=LIGHT_STATE_PATH)
+# Per intersection: its planner, the plan last sent to its heads and when that phase started
+planners = {intersection_id: SignalPlanner() for intersection_id in intersections}
+planners[default_intersection] = planner
+commanded_plans: Dict[str, Dict[str, str]] = {}
+phase_started: Dict[str, float] = {}
 
-async def determine_traffic_light_states(situation: str) -> dict:
-    """
-    Use Gemini to determine traffic light states based on the traffic situation.
-    Returns a dictionary with traffic light states.
-    """
-    prompt = f"""You are controlling a complex intersection with three traffic lights.
+# Camera reports, from the backend's detections to the controller and to confirmed light changes.
+# Detection times come from the backend's clock, so these assume both run on one host or synced clocks.
+approach_counts = {"reports": 0, "replans": 0, "held": 0, "unchanged": 0, "unconfirmed_changes": 0}
+detection_to_controller = LatencyWindow()
+detection_to_signal = LatencyWindow()
+
+# Intersection -> monotonic time until which camera re-plans leave an emergency corridor alone
+preempted_until: Dict[str, float] = {}
+preempt_counts = {"preemptions": 0, "over_budget": 0}
+preempt_dispatch = LatencyWindow()
+preempt_confirm = LatencyWindow()
+preempt_detection_to_confirm = LatencyWindow()
+
+def build_prompt(situation: str, current: Dict[str, str]) -> str:
+    current_lights = format_plan(current).replace("\n", "\n    ")
+    return f"""You are controlling a complex intersection with three traffic lights.
     Determine which lights should be green or red based on the traffic situation.
 
     The intersection has:
@@ -70,6 +211,10 @@ async def determine_traffic_light_states(situation: str) -> dict:
        - Can set straight and turn signals independently
        - If traffic is heavy in both straight and turn lanes, allow both
        - If only one is congested, prioritize that one
+    7. If the situation gives no reason to change, keep the current lights
+
+    Current lights:
+    {current_lights}
 
     Traffic situation: {situation}
 
@@ -80,103 +225,331 @@ async def determine_traffic_light_states(situation: str) -> dict:
     west: red
 
     Replace 'red' with 'green' where appropriate based on the traffic situation."""
+
+def parse_light_states(response_text: str) -> Dict[str, str]:
+    """Parse the model's "key: color" lines, unknown colors become red for safety"""
+    states = {}
+    for line in response_text.strip().split('\n'):
+        key, value = line.split(': ')
+        states[key.strip()] = value.strip()
+    
+    # Validate the response format
+    required_keys = ["north", "east_straight", "east_turn", "west"]
+    if not all(key in states for key in required_keys):
+        raise ValueError(f"Missing required keys in response. Got: {states.keys()}")
+    
+    # Validate each state
+    for key, value in states.items():
+        value = value.lower()
+        if value not in ["red", "green"]:
+            states[key] = "red"  # Default to red for safety
+        else:
+            states[key] = value
     
+    return states
+
+def ask_advisor(situation: str, current: Dict[str, str]) -> Dict[str, str]:
+    """Blocking LLM call, run it in a worker thread"""
+    response = model.generate_content(build_prompt(situation, current))
+    return parse_light_states(response.text)
+
+async def ask_advisor_checked(situation: str, current: Dict[str, str]) -> Dict[str, str]:
+    """Advisor call under the timeout; unsafe plans raise so they are never cached"""
+    states = await asyncio.wait_for(asyncio.to_thread(ask_advisor, situation, current), timeout=LLM_TIMEOUT)
+    if not is_valid_plan(states):
+        # Never let the advisor turn two directions green at once
+        raise ValueError(f"Ignoring unsafe advisor plan: {states}")
+    return states
+
+async def decide(situation: str, planner: SignalPlanner) -> tuple:
+    parsed = parse_situation(situation)
+    if parsed.is_actionable() or model is None:
+        return planner.plan(parsed), "planner"
+
+    # Identical situations share one advisor call, whether repeated later or arriving concurrently. The
+    # answer can depend on the lights it started from, so those are part of the key.
+    current = dict(planner.last_plan)
     try:
-        # Get Gemini's response
-        response = model.generate_content(prompt.format(situation=situation))
-        response_text = response.text.strip()
-        
-        # Parse the response into a dictionary
-        states = {}
-        for line in response_text.split('\n'):
-            key, value = line.split(': ')
-            states[key.strip()] = value.strip()
-        
-        # Validate the response format
-        required_keys = ["north", "east_straight", "east_turn", "west"]
-        if not all(key in states for key in required_keys):
-            raise ValueError(f"Missing required keys in response. Got: {states.keys()}")
-        
-        # Validate each state
-        for key, value in states.items():
-            value = value.lower()
-            if value not in ["red", "green"]:
-                states[key] = "red"  # Default to red for safety
-            else:
-                states[key] = value
-        
-        return states
-        
+        states = await decision_cache.get_or_compute(
+            (normalize_situation(situation), format_plan(current)), lambda: ask_advisor_checked(situation, current))
+    except asyncio.TimeoutError:
+        print(f"LLM advisor timed out after {LLM_TIMEOUT}s, keeping the planned phase")
+        return planner.plan(parsed), "fallback"
     except Exception as e:
         print(f"Error processing traffic lights: {str(e)}")
-        # If any error occurs, return all red for safety
-        return {
-            "north": "red",
-            "east_straight": "red",
-            "east_turn": "red",
-            "west": "red"
-        }
+        return planner.plan(parsed), "fallback"
+
+    planner.last_plan = dict(states)
+    return states, "advisor"
+
+async def determine_traffic_light_states(situation: str, planner: SignalPlanner = planner) -> dict:
+    """
+    Determine traffic light states for the traffic situation, with the intersection's own planner.
+    The rule planner answers in microseconds; the LLM advisor is only consulted, under a timeout,
+    when the planner finds nothing it can act on, and its answers are cached per normalized
+    situation. Returns a dictionary with traffic light states.
+    """
+    started = time.perf_counter()
+    states, source = await decide(situation, planner)
+    elapsed = time.perf_counter() - started
+    decision_sources[source] += 1
+    decision_seconds["total"] += elapsed
+    decision_seconds["max"] = max(decision_seconds["max"], elapsed)
+    decision_seconds["count"] += 1
+    return states
+
+async def send_command(ctx: Context, head, states: Dict[str, str]) -> Dict[str, Any]:
+    """Send one head its phase and wait, up to LIGHT_ACK_TIMEOUT, for it to confirm"""
+    color, turn_color = head.colors(states)
+    command_id = uuid.uuid4().hex
+    future = asyncio.get_running_loop().create_future()
+    pending_acks[command_id] = future
+    started = time.perf_counter()
+    sent_ms = None
+    try:
+        await asyncio.wait_for(ctx.send(head.address, ControllerMessage(
+            text="Direct command",
+            color=color,
+            turn_color=turn_color,
+            command_id=command_id,
+            head=head.host_head
+        )), timeout=LIGHT_ACK_TIMEOUT)
+        sent_ms = (time.perf_counter() - started) * 1000
+        await asyncio.wait_for(future, timeout=max(LIGHT_ACK_TIMEOUT - (time.perf_counter() - started), 0))
+        confirmed = True
+    except asyncio.TimeoutError:
+        confirmed = False
+    except Exception as e:
+        ctx.logger.error(f"Error sending to light {head.id}: {str(e)}")
+        confirmed = False
+    finally:
+        pending_acks.pop(command_id, None)
+    return {"head": head.id, "confirmed": confirmed, "sent_ms": sent_ms, "ms": (time.perf_counter() - started) * 1000}
+
+@controller.on_message(LightAck)
+async def handle_light_ack(ctx: Context, sender: str, msg: LightAck):
+    # Late acks still update the state even though the command was already reported unconfirmed
+    if not light_state.apply_ack(sender, msg.color, msg.turn_color, msg.head):
+        ctx.logger.warning(f"Ack from {sender}, which is not in the topology")
+    future = pending_acks.get(msg.command_id)
+    if future is not None and not future.done():
+        future.set_result(msg)
+
+async def apply_plan(ctx: Context, intersection, states: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Send every head of the intersection its phase at the same time, so the change lands together"""
+    if commanded_plans.get(intersection.id) != states:
+        phase_started[intersection.id] = time.monotonic()
+    commanded_plans[intersection.id] = dict(states)
+    return await asyncio.gather(*(send_command(ctx, head, states) for head in intersection.heads))
 
 @controller.on_rest_post("/lights", Request, Response)
 async def handle_traffic_message(ctx: Context, req: Request) -> Response:
-    # Get traffic light states from Gemini
-    states = await determine_traffic_light_states(req.text)
-    
-    # Send commands to each traffic light
-    await ctx.send(TRAFFIC_LIGHT_1_ADDRESS, ControllerMessage(
-        text="Direct command",
-        color=states["north"],
-        turn_color="red"  # Not used but needed for schema compatibility
-    ))
-    await ctx.send(TRAFFIC_LIGHT_2_ADDRESS, ControllerMessage(
-        text="Direct command",
-        color=states["east_straight"],
-        turn_color=states["east_turn"]
-    ))
-    await ctx.send(TRAFFIC_LIGHT_3_ADDRESS, ControllerMessage(
-        text="Direct command",
-        color=states["west"],
-        turn_color="red"  # Not used but needed for schema compatibility
-    ))
-    
+    intersection = intersections.get(req.intersection or default_intersection)
+    if intersection is None:
+        return Response(message=f"Unknown intersection: {req.intersection}")
+
+    states = await determine_traffic_light_states(req.text, planners[intersection.id])
+    results = await apply_plan(ctx, intersection, states)
+    confirmed = [r["head"] for r in results if r["confirmed"]]
+    unconfirmed = [r["head"] for r in results if not r["confirmed"]]
+
     ctx.logger.info(f"Traffic situation: {req.text}")
-    ctx.logger.info(f"""Set traffic light states:
+    ctx.logger.info(f"""Set traffic light states at {intersection.id}:
         North: {states['north']}
         East Straight: {states['east_straight']}
         East Left Turn: {states['east_turn']}
-        West: {states['west']}""")
-    
-    return Response(message="Traffic light states updated")
+        West: {states['west']}
+        Acks: {', '.join(f"{r['head']} {r['ms']:.0f}ms" if r['confirmed'] else f"{r['head']} timed out" for r in results)}""")
+
+    if unconfirmed:
+        return Response(message=f"Traffic light states sent, no confirmation from: {', '.join(unconfirmed)}",
+                        states=states, confirmed=confirmed, unconfirmed=unconfirmed)
+    return Response(message="Traffic light states updated", states=states, confirmed=confirmed,
+                    unconfirmed=unconfirmed)
+
+@controller.on_rest_post("/approach-metrics", ApproachReport, ApproachResponse)
+async def handle_approach_metrics(ctx: Context, report: ApproachReport) -> ApproachResponse:
+    """Re-plan from the cameras' per-approach metrics, pushed by the backend on a fixed cadence"""
+    received = time.time()
+    intersection = intersections.get(report.intersection or default_intersection)
+    if intersection is None:
+        return ApproachResponse(message=f"Unknown intersection: {report.intersection}")
+    if not report.approaches:
+        return ApproachResponse(message="No approaches in report")
+
+    approach_counts["reports"] += 1
+    detected_at = max(metrics.detected_at for metrics in report.approaches)
+    detection_to_controller.observe((received - detected_at) * 1000)
+
+    commanded = commanded_plans.get(intersection.id)
+    if time.monotonic() < preempted_until.get(intersection.id, 0.0):
+        approach_counts["held"] += 1
+        return ApproachResponse(message="Emergency preemption active", states=commanded or {})
+    situation = situation_from_metrics([metrics.dict() for metrics in report.approaches])
+    if (commanded is not None and not situation.emergency
+            and time.monotonic() - phase_started[intersection.id] < MIN_PHASE_SECONDS):
+        # Checked before planning so held reports do not advance the all-congested cycle
+        approach_counts["held"] += 1
+        return ApproachResponse(message="Holding the current phase", states=commanded)
+
+    states = planners[intersection.id].plan(situation)
+    if states == commanded:
+        approach_counts["unchanged"] += 1
+        return ApproachResponse(message="Phase unchanged", states=states)
+
+    results = await apply_plan(ctx, intersection, states)
+    approach_counts["replans"] += 1
+    confirmed = [r["head"] for r in results if r["confirmed"]]
+    unconfirmed = [r["head"] for r in results if not r["confirmed"]]
+    if unconfirmed:
+        approach_counts["unconfirmed_changes"] += 1
+    else:
+        # Detection to the last head confirming its new phase
+        detection_to_signal.observe((time.time() - detected_at) * 1000)
+    ctx.logger.info(f"Re-planned {intersection.id} from camera metrics: {states}")
+    return ApproachResponse(message="Phase changed", replanned=True, states=states,
+                            confirmed=confirmed, unconfirmed=unconfirmed)
+
+@controller.on_rest_post("/preempt", PreemptRequest, PreemptResponse)
+async def handle_preempt(ctx: Context, req: PreemptRequest) -> PreemptResponse:
+    """Give an emergency vehicle's direction green at once, skipping the planner, the advisor and the phase hold"""
+    started = time.perf_counter()
+    if req.approach not in DIRECTIONS:
+        return PreemptResponse(message=f"Unknown approach: {req.approach}")
+    targets = []
+    for intersection_id in [req.intersection or default_intersection] + list(req.corridor):
+        if intersection_id not in intersections:
+            return PreemptResponse(message=f"Unknown intersection: {intersection_id}")
+        if not intersections[intersection_id].heads:
+            return PreemptResponse(message=f"No signal heads configured at intersection: {intersection_id}")
+        if intersections[intersection_id] not in targets:
+            targets.append(intersections[intersection_id])
+
+    states = corridor_plan(req.approach)
+    hold_until = time.monotonic() + PREEMPT_HOLD_SECONDS
+    for intersection in targets:
+        preempted_until[intersection.id] = hold_until
+        planners[intersection.id].last_plan = dict(states)
+    # Every intersection of the corridor and every head in it at the same time
+    results = [r for batch in await asyncio.gather(*(apply_plan(ctx, i, states) for i in targets)) for r in batch]
+
+    confirmed = [r["head"] for r in results if r["confirmed"]]
+    unconfirmed = [r["head"] for r in results if not r["confirmed"]]
+    dispatch_ms = max((r["sent_ms"] or r["ms"]) for r in results)
+    confirm_ms = (time.perf_counter() - started) * 1000 if not unconfirmed else None
+    detection_ms = None
+    if confirm_ms is not None and req.detected_at is not None:
+        detection_ms = (time.time() - req.detected_at) * 1000
+    within_budget = confirm_ms is not None and confirm_ms <= PREEMPT_BUDGET_MS
+
+    preempt_counts["preemptions"] += 1
+    preempt_dispatch.observe(dispatch_ms)
+    if confirm_ms is not None:
+        preempt_confirm.observe(confirm_ms)
+    if detection_ms is not None:
+        preempt_detection_to_confirm.observe(detection_ms)
+    if not within_budget:
+        preempt_counts["over_budget"] += 1
+        ctx.logger.warning(f"Preemption for {req.approach} missed the {PREEMPT_BUDGET_MS:.0f}ms budget: "
+                           f"{'unconfirmed ' + ', '.join(unconfirmed) if unconfirmed else f'{confirm_ms:.0f}ms'}")
+    ctx.logger.info(f"Emergency corridor {req.approach} at {', '.join(i.id for i in targets)}"
+                    + (f" (camera {req.camera}, track {req.track_id})" if req.camera else ""))
+
+    return PreemptResponse(
+        message="Emergency corridor set" if not unconfirmed else
+                f"Emergency corridor sent, no confirmation from: {', '.join(unconfirmed)}",
+        states=states,
+        intersections=[i.id for i in targets],
+        confirmed=confirmed,
+        unconfirmed=unconfirmed,
+        dispatch_ms=round(dispatch_ms, 2),
+        confirm_ms=round(confirm_ms, 2) if confirm_ms is not None else None,
+        detection_to_confirm_ms=round(detection_ms, 2) if detection_ms is not None else None,
+        within_budget=within_budget
+    )
+
+def head_status(head_id: str) -> LightStatus:
+    state = light_state.get(default_intersection, head_id)
+    return LightStatus(color=state["color"], turn_color=state["turn_color"])
 
 @controller.on_rest_get("/north", response=LightStatus)
 async def get_north_status(ctx: Context) -> LightStatus:
-    try:
-        with open("light1.json", "r") as f:
-            state = json.load(f)
-        return LightStatus(color=state["color"])
-    except Exception as e:
-        ctx.logger.error(f"Error reading north light status: {str(e)}")
-        return LightStatus(color="red")  # Default to red for safety
+    return head_status("north")
 
 @controller.on_rest_get("/east", response=LightStatus)
 async def get_east_status(ctx: Context) -> LightStatus:
-    try:
-        with open("light2.json", "r") as f:
-            state = json.load(f)
-        return LightStatus(color=state["straight"], turn_color=state["left_turn"])
-    except Exception as e:
-        ctx.logger.error(f"Error reading east light status: {str(e)}")
-        return LightStatus(color="red", turn_color="red")  # Default to red for safety
+    return head_status("east")
 
 @controller.on_rest_get("/west", response=LightStatus)
 async def get_west_status(ctx: Context) -> LightStatus:
-    try:
-        with open("light3.json", "r") as f:
-            state = json.load(f)
-        return LightStatus(color=state["color"])
-    except Exception as e:
-        ctx.logger.error(f"Error reading west light status: {str(e)}")
-        return LightStatus(color="red")  # Default to red for safety
+    return head_status("west")
+
+@controller.on_event("startup")
+async def start_light_stream(ctx: Context):
+    # Keep a reference so the server is not garbage collected
+    global light_stream_server
+    light_stream_server = await light_state.serve("0.0.0.0", LIGHT_STREAM_PORT)
+    ctx.logger.info(f"Light state stream on http://localhost:{LIGHT_STREAM_PORT}/events")
+
+@controller.on_interval(period=1.0)
+async def snapshot_light_state(ctx: Context):
+    snapshot = light_state.take_snapshot()
+    if snapshot is not None:
+        await asyncio.to_thread(write_json_atomic, light_state.snapshot_path, snapshot)
+
+@controller.on_rest_get("/decision-stats", response=DecisionStats)
+async def get_decision_stats(ctx: Context) -> DecisionStats:
+    cache = decision_cache.stats()
+    count = decision_seconds["count"]
+    return DecisionStats(
+        cache_entries=cache["entries"],
+        cache_in_flight=cache["in_flight"],
+        cache_hits=cache["hits"],
+        cache_misses=cache["misses"],
+        cache_coalesced=cache["coalesced"],
+        cache_expired=cache["expired"],
+        cache_evicted=cache["evicted"],
+        cache_failures=cache["failures"],
+        cache_hit_rate=cache["hit_rate"],
+        advisor_avg_ms=cache["avg_miss_ms"],
+        advisor_max_ms=cache["max_miss_ms"],
+        planner_decisions=decision_sources["planner"],
+        advisor_decisions=decision_sources["advisor"],
+        fallback_decisions=decision_sources["fallback"],
+        decision_avg_ms=round(decision_seconds["total"] / count * 1000, 3) if count else 0.0,
+        decision_max_ms=round(decision_seconds["max"] * 1000, 3)
+    )
+
+@controller.on_rest_get("/signal-latency", response=SignalLatencyStats)
+async def get_signal_latency(ctx: Context) -> SignalLatencyStats:
+    transport = detection_to_controller.summary()
+    signal = detection_to_signal.summary()
+    return SignalLatencyStats(
+        **approach_counts,
+        detection_to_controller_p50_ms=transport["p50_ms"],
+        detection_to_controller_p99_ms=transport["p99_ms"],
+        detection_to_signal_p50_ms=signal["p50_ms"],
+        detection_to_signal_p99_ms=signal["p99_ms"],
+        detection_to_signal_max_ms=signal["max_ms"],
+        signal_changes_measured=signal["count"]
+    )
+
+@controller.on_rest_get("/preempt-stats", response=PreemptStats)
+async def get_preempt_stats(ctx: Context) -> PreemptStats:
+    dispatch = preempt_dispatch.summary()
+    confirm = preempt_confirm.summary()
+    detection = preempt_detection_to_confirm.summary()
+    return PreemptStats(
+        **preempt_counts,
+        budget_ms=PREEMPT_BUDGET_MS,
+        dispatch_p50_ms=dispatch["p50_ms"],
+        dispatch_p99_ms=dispatch["p99_ms"],
+        confirm_p50_ms=confirm["p50_ms"],
+        confirm_p99_ms=confirm["p99_ms"],
+        confirm_max_ms=confirm["max_ms"],
+        detection_to_confirm_p50_ms=detection["p50_ms"],
+        detection_to_confirm_p99_ms=detection["p99_ms"]
+    )
 
 if __name__ == "__main__":
     controller.run()
\ No newline at end of file
@@ -0,0 +1,90 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+FILLER_WORDS = {"the", "a", "an", "is", "are", "there", "please", "right", "now", "currently", "at", "on", "in"}
+
+
+def normalize_situation(text: str) -> str:
+    """Cache key for a free-text situation: case, punctuation, spacing and filler words do not matter"""
+    words = re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+
+class DecisionCache:
+    """LRU + TTL cache of light-state decisions that also coalesces concurrent identical requests
+
+    Only successful computations are cached; a failure is handed to every coalesced waiter and the
+    next request tries again.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.evicted = 0
+        self.failures = 0
+        self._miss_seconds = 0.0
+        self._miss_seconds_max = 0.0
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1])
+            del self._entries[key]
+            self.expired += 1
+
+        if key in self._in_flight:
+            # Same situation is already being decided, wait for that answer instead of asking again
+            self.coalesced += 1
+            return dict(await asyncio.shield(self._in_flight[key]))
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        started = time.perf_counter()
+        try:
+            value = await compute()
+        except BaseException as e:
+            self.failures += 1
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so an unawaited failure is not logged as lost
+            raise
+        else:
+            future.set_result(value)
+            self._entries[key] = (time.monotonic() + self.ttl, dict(value))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            return dict(value)
+        finally:
+            del self._in_flight[key]
+            elapsed = time.perf_counter() - started
+            self._miss_seconds += elapsed
+            self._miss_seconds_max = max(self._miss_seconds_max, elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "failures": self.failures,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "avg_miss_ms": round(self._miss_seconds / self.misses * 1000, 2) if self.misses else 0.0,
+            "max_miss_ms": round(self._miss_seconds_max * 1000, 2),
+        }
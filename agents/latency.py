@@ -0,0 +1,33 @@
+import math
+from collections import deque
+from typing import Dict, Iterable
+
+
+def percentile(values: Iterable[float], q: float) -> float:
+    """Nearest-rank percentile, 0.0 for no values"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LatencyWindow:
+    """Most recent latency samples in milliseconds, summarized on demand"""
+
+    def __init__(self, size: int = 1000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def observe(self, milliseconds: float):
+        self.samples.append(milliseconds)
+        self.count += 1
+
+    def summary(self) -> Dict[str, float]:
+        samples = list(self.samples)
+        return {
+            "count": self.count,
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+            "max_ms": round(max(samples), 2) if samples else 0.0,
+        }
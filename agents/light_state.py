@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+SAFE_STATE = {"color": "red", "turn_color": "red"}
+
+
+def write_json_atomic(path: str, data) -> None:
+    """Write to a temporary file next to `path` and rename it over, so readers never see half a file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def bare_address(address: str) -> str:
+    """Agent address without the network prefix, senders of incoming messages carry none"""
+    return address.split("://")[-1]
+
+
+class LightStateStore:
+    """Authoritative light state, kept in memory and updated from the lights' acks
+
+    Changes are pushed to stream subscribers as they happen; the disk snapshot only exists so a
+    restarted controller starts from the last known state.
+    """
+
+    def __init__(self, intersections, snapshot_path: Optional[str] = None):
+        self.snapshot_path = snapshot_path
+        self.heads_by_address = {}
+        self.states: Dict[str, Dict[str, dict]] = {}
+        for intersection in intersections.values():
+            self.states[intersection.id] = {}
+            for head in intersection.heads:
+                self.heads_by_address[(bare_address(head.address), head.host_head)] = (intersection.id, head.id)
+                self.states[intersection.id][head.id] = dict(SAFE_STATE, updated=None)
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.dirty = False
+        self.changes = 0
+        self._load_snapshot()
+
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable light state snapshot: {e}")
+            return
+        for intersection_id, heads in snapshot.items():
+            for head_id, state in heads.items():
+                # Heads removed from the topology since the snapshot are dropped
+                if head_id in self.states.get(intersection_id, {}):
+                    self.states[intersection_id][head_id].update(state)
+
+    def get(self, intersection_id: str, head_id: str) -> dict:
+        return self.states.get(intersection_id, {}).get(head_id, dict(SAFE_STATE, updated=None))
+
+    def apply_ack(self, sender: str, color: str, turn_color: str, head: Optional[str] = None) -> bool:
+        """Record what a light confirmed it is showing, returns False for senders not in the topology"""
+        target = self.heads_by_address.get((bare_address(sender), head))
+        if target is None:
+            return False
+        intersection_id, head_id = target
+        state = self.states[intersection_id][head_id]
+        if state["color"] != color or state["turn_color"] != turn_color or state["updated"] is None:
+            state.update(color=color, turn_color=turn_color,
+                         updated=datetime.now(timezone.utc).isoformat())
+            self.dirty = True
+            self.changes += 1
+            self.publish(intersection_id)
+        return True
+
+    def event(self, intersection_id: str) -> str:
+        return json.dumps({"intersection": intersection_id, "lights": self.states[intersection_id],
+                           "timestamp": datetime.now(timezone.utc).isoformat()})
+
+    def publish(self, intersection_id: str):
+        payload = self.event(intersection_id)
+        for queue in self.subscribers:
+            if queue.full():
+                # Slow client: drop its oldest pending event, only the latest state matters
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+    def take_snapshot(self) -> Optional[dict]:
+        """Copy of the state for the disk snapshot, None when nothing changed since the last one
+
+        Call it on the event loop: acks keep updating the state there, so only the copy may go to a thread.
+        """
+        if not self.snapshot_path or not self.dirty:
+            return None
+        self.dirty = False
+        return {intersection_id: {head_id: dict(state) for head_id, state in heads.items()}
+                for intersection_id, heads in self.states.items()}
+
+    def save_snapshot(self):
+        snapshot = self.take_snapshot()
+        if snapshot is not None:
+            write_json_atomic(self.snapshot_path, snapshot)
+
+    async def serve(self, host: str, port: int):
+        """Plain HTTP server next to the agent's REST port: /events is a Server-Sent Events stream of
+        state changes and /state is the current state as JSON"""
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode(errors="replace").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            path = request_line[1].split("?")[0] if len(request_line) > 1 else "/"
+
+            if path == "/events":
+                await self._stream_events(writer)
+            elif path == "/state":
+                body = json.dumps(self.states).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Access-Control-Allow-Origin: *\r\nCache-Control: no-cache\r\n"
+                             + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+                await writer.drain()
+            else:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _stream_events(self, writer: asyncio.StreamWriter):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n")
+        queue = asyncio.Queue(maxsize=16)
+        self.subscribers.add(queue)
+        try:
+            # New clients get the full state first, then only changes
+            for intersection_id in self.states:
+                writer.write(f"data: {self.event(intersection_id)}\n\n".encode())
+            await writer.drain()
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=15.0)
+                    writer.write(f"data: {payload}\n\n".encode())
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    writer.write(b": keepalive\n\n")
+                await writer.drain()
+        finally:
+            self.subscribers.discard(queue)
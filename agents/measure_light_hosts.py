@@ -0,0 +1,124 @@
+"""Compare startup time and memory of one process per light with one light host for many heads
+
+Starts the three traffic_light_N.py agents, then traffic_light_host.py with --heads generated heads,
+waits for each to accept connections on its port and reads its resident memory.
+
+    python measure_light_hosts.py --heads 300
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+AGENTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PER_PROCESS_AGENTS = [("traffic_light_1.py", 5050), ("traffic_light_2.py", 5051), ("traffic_light_3.py", 5053)]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float) -> float:
+    """Seconds until the agent's server accepts a connection"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Agent on port {port} exited with {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return time.perf_counter() - started
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"Agent on port {port} did not start within {timeout}s")
+
+
+def rss_mb(pid: int) -> float:
+    output = subprocess.check_output(["ps", "-o", "rss=", "-p", str(pid)]).decode().strip()
+    return int(output) / 1024  # ps reports kilobytes
+
+
+def start(args, port, timeout, workdir):
+    process = subprocess.Popen([sys.executable] + args, cwd=workdir,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        seconds = wait_for_port(port, process, timeout)
+        time.sleep(1.0)  # Let the agent finish its startup handlers before reading memory
+        return process, seconds, rss_mb(process.pid)
+    except BaseException:
+        process.kill()
+        raise
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def measure_per_process(timeout, workdir):
+    processes, startup, rss = [], [], []
+    try:
+        for script, port in PER_PROCESS_AGENTS:
+            process, seconds, mb = start([os.path.join(AGENTS_DIR, script)], port, timeout, workdir)
+            processes.append(process)
+            startup.append(seconds)
+            rss.append(mb)
+    finally:
+        stop(processes)
+    lights = len(PER_PROCESS_AGENTS)
+    return {
+        "lights": lights,
+        "processes": lights,
+        "startup_s": round(sum(startup), 3),  # Started one after another, like run.sh
+        "startup_s_per_light": round(sum(startup) / lights, 3),
+        "rss_mb": round(sum(rss), 1),
+        "rss_mb_per_light": round(sum(rss) / lights, 2),
+    }
+
+
+def measure_host(heads, port, timeout, workdir):
+    config = {
+        "name": "traffic_light_host_bench",
+        "seed": "traffic light host bench phrase",
+        "port": port,
+        "heads": {f"head_{index}": {"turn": index % 3 == 1} for index in range(heads)},
+    }
+    config_path = os.path.join(workdir, "light_host_bench.json")
+    with open(config_path, "w") as f:
+        json.dump(config, f)
+
+    process, seconds, mb = start([os.path.join(AGENTS_DIR, "traffic_light_host.py"), "--config", config_path],
+                                 port, timeout, workdir)
+    stop([process])
+    return {
+        "lights": heads,
+        "processes": 1,
+        "startup_s": round(seconds, 3),
+        "startup_s_per_light": round(seconds / heads, 4),
+        "rss_mb": round(mb, 1),
+        "rss_mb_per_light": round(mb / heads, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure light agent startup time and memory")
+    parser.add_argument('--heads', type=int, default=300, help="heads served by the light host")
+    parser.add_argument('--port', type=int, default=5060, help="port for the light host")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--output', default=None, help="write the JSON result here")
+    args = parser.parse_args()
+
+    # Agents write their state files into the working directory, keep them out of the repo
+    workdir = tempfile.mkdtemp(prefix="light-hosts-")
+    result = {
+        "per_process": measure_per_process(args.timeout, workdir),
+        "light_host": measure_host(args.heads, args.port, args.timeout, workdir),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
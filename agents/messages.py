@@ -0,0 +1,40 @@
+from typing import Dict
+
+from uagents import Model
+from uagents.resolver import GlobalResolver, Resolver, RulesBasedResolver
+
+# Messages between the controller and the light agents. uAgents matches handlers by schema digest,
+# so every agent imports them from here instead of keeping its own copy.
+
+
+class ControllerMessage(Model):
+    text: str
+    color: str
+    turn_color: str = "red"  # Default to red for left turn
+    command_id: str = None  # Set when the controller wants a LightAck
+    head: str = None  # Signal head at a light host, None for single-light agents
+
+
+class LightAck(Model):
+    command_id: str
+    color: str
+    turn_color: str = "red"
+    head: str = None
+
+
+class LocalFirstResolver(Resolver):
+    """Agents with a configured endpoint are reached directly, only the others are looked up in the almanac
+
+    Skipping the almanac query keeps a network round trip out of every command and ack on the hot path.
+    """
+
+    def __init__(self, endpoints: Dict[str, str]):
+        # Keys are agent addresses without the network prefix
+        self.rules = RulesBasedResolver({address.split("://")[-1]: endpoint for address, endpoint in endpoints.items()})
+        self.fallback = GlobalResolver()
+
+    async def resolve(self, destination: str):
+        address, endpoints = await self.rules.resolve(destination.split("://")[-1])
+        if endpoints:
+            return address, endpoints
+        return await self.fallback.resolve(destination)
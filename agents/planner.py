@@ -0,0 +1,253 @@
+import re
+import sys
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Dict, List
+
+# Directions of the intersection, in the order used when cycling through congested approaches
+DIRECTIONS = ["east", "north", "west"]
+LIGHT_KEYS = ["north", "east_straight", "east_turn", "west"]
+ALL_RED = {key: "red" for key in LIGHT_KEYS}
+
+DIRECTION_WORDS = {
+    "north": ("north", "northbound"),
+    "east": ("east", "eastbound"),
+    "west": ("west", "westbound"),
+}
+ALL_DIRECTION_WORDS = ("all directions", "every direction", "all approaches", "everywhere", "all sides")
+# "traffic" alone says nothing about how much of it there is, it only counts with a qualifier
+CONGESTION_WORDS = ("congest", "heavy", "jam", "backed up", "backup", "busy", "queue", "gridlock",
+                    "crowded", "packed", "slow", "lot of traffic", "lots of traffic", "bad traffic",
+                    "lot of cars", "lots of cars", "many cars")
+INTENSITY_WORDS = ("very", "extremely", "severe", "major", "massive", "huge", "really")
+CLEAR_WORDS = ("no traffic", "clear", "empty", "quiet", "free flowing", "free-flowing", "flowing", "freely",
+               "moving well", "smooth")
+LIGHT_TRAFFIC = re.compile(r"\blight\b")  # "traffic is light", but "lights" are the signals
+# A congestion or emergency word right after one of these is denied, not reported ("north is not heavy")
+NEGATION_WORDS = ("no", "not", "isn't", "isnt", "aren't", "arent", "without", "never", "nothing")
+NEGATION_REACH = 2  # Words allowed between the negation and what it denies
+EMERGENCY_WORDS = ("ambulance", "emergency", "fire truck", "firetruck", "fire engine", "police", "siren")
+TURN_WORDS = ("turn", "left")
+STRAIGHT_WORDS = ("straight", "through")
+
+# An approach reported by the cameras counts as congested from this many queued vehicles, or with this
+# share of its area covered by vehicles
+QUEUE_CONGESTED = 3
+OCCUPANCY_CONGESTED = 0.35
+
+CLAUSE_SPLIT = re.compile(r"[.;,!?\n]|\bbut\b|\bwhile\b|\bwhereas\b")
+AND_SPLIT = re.compile(r"\band\b|&")
+
+
+@dataclass
+class Situation:
+    """Structured view of the traffic at the intersection, from free text or from detector counts"""
+    congestion: Dict[str, float] = field(default_factory=dict)  # direction -> how congested, 0 means clear
+    emergency: List[str] = field(default_factory=list)  # directions with an emergency vehicle, most urgent first
+    east_lanes: set = field(default_factory=set)  # "straight" and/or "turn" when the text names a lane
+    emergency_east_lanes: set = field(default_factory=set)
+
+    def is_actionable(self) -> bool:
+        return bool(self.emergency) or any(score > 0 for score in self.congestion.values())
+
+
+def _mentions(clause: str, words) -> bool:
+    return any(re.search(rf"\b{re.escape(word)}", clause) for word in words)
+
+
+def _asserts(clause: str, words) -> bool:
+    """True if one of the words appears without a negation shortly before it"""
+    for word in words:
+        for match in re.finditer(rf"\b{re.escape(word)}", clause):
+            before = clause[:match.start()].split()[-(NEGATION_REACH + 1):]
+            if not any(token in NEGATION_WORDS for token in before):
+                return True
+    return False
+
+
+def _is_clear(clause: str) -> bool:
+    return _mentions(clause, CLEAR_WORDS) or LIGHT_TRAFFIC.search(clause) is not None
+
+
+def _has_predicate(clause: str) -> bool:
+    return _mentions(clause, CONGESTION_WORDS + CLEAR_WORDS + EMERGENCY_WORDS) or _is_clear(clause)
+
+
+def split_clauses(text: str) -> List[str]:
+    """Split on punctuation and contrasts, and on "and" only where both sides say something
+
+    "north and west are congested" stays one clause, "heavy north and clear west" becomes two.
+    """
+    clauses = []
+    for sentence in CLAUSE_SPLIT.split(text.lower()):
+        parts = [part.strip() for part in AND_SPLIT.split(sentence) if part.strip()]
+        merged = []
+        pending = ""
+        for part in parts:
+            pending = f"{pending} {part}".strip()
+            if _has_predicate(pending):
+                merged.append(pending)
+                pending = ""
+        if pending:
+            # Trailing words with no predicate of their own belong to the previous part
+            if merged:
+                merged[-1] = f"{merged[-1]} {pending}"
+            else:
+                merged.append(pending)
+        clauses.extend(merged)
+    return clauses
+
+
+def parse_situation(text: str) -> Situation:
+    """Pull congested directions, emergencies and east lanes out of an operator's description"""
+    situation = Situation()
+    east_emergency = False  # Whether lanes named without a direction still describe an east emergency
+    for clause in split_clauses(text):
+        directions = [d for d in DIRECTIONS if _mentions(clause, DIRECTION_WORDS[d])]
+        if _mentions(clause, ALL_DIRECTION_WORDS):
+            directions = list(DIRECTIONS)
+
+        turn = _mentions(clause, TURN_WORDS)
+        straight = _mentions(clause, STRAIGHT_WORDS)
+
+        if not directions:
+            # "ambulance from the east, needs to turn left": the lane comes in a clause of its own
+            if east_emergency:
+                situation.emergency_east_lanes.update((["turn"] if turn else []) + (["straight"] if straight else []))
+            continue
+        east_emergency = False
+
+        if _asserts(clause, EMERGENCY_WORDS):
+            for direction in directions:
+                if direction not in situation.emergency:
+                    situation.emergency.append(direction)
+            if "east" in directions:
+                east_emergency = True
+                situation.emergency_east_lanes.update((["turn"] if turn else []) + (["straight"] if straight else []))
+            continue
+
+        if _is_clear(clause) or not _asserts(clause, CONGESTION_WORDS):
+            continue
+        score = 1.0 + sum(clause.count(word) for word in INTENSITY_WORDS)
+        for direction in directions:
+            situation.congestion[direction] = situation.congestion.get(direction, 0.0) + score
+        if "east" in directions and (turn or straight):
+            situation.east_lanes.update((["turn"] if turn else []) + (["straight"] if straight else []))
+    return situation
+
+
+def situation_from_metrics(approaches: List[dict]) -> Situation:
+    """Situation from the backend's per-approach queue length, occupancy and arrival rate"""
+    situation = Situation()
+    for metrics in approaches:
+        direction = metrics.get("approach")
+        if direction not in DIRECTIONS:
+            continue
+        queue = metrics.get("queue_length", 0)
+        occupancy = metrics.get("occupancy", 0.0)
+        if queue < QUEUE_CONGESTED and occupancy < OCCUPANCY_CONGESTED:
+            continue
+        # Longer queues win between congested directions, then fuller approaches, then busier ones
+        score = queue + occupancy * 10 + metrics.get("arrival_rate", 0.0) / 60
+        # Cameras that overlap on one approach should not add up
+        situation.congestion[direction] = max(situation.congestion.get(direction, 0.0), score)
+    return situation
+
+
+class SignalPlanner:
+    """Deterministic version of the controller's rules, cheap enough to run on every request
+
+    1. One congested direction gets the green.
+    2. Several congested directions: east wins if it is one of them, otherwise the most congested.
+    3. All directions congested: cycle through them starting with east.
+    4. Emergency vehicles always get their direction.
+    5. Only one direction is ever green.
+    6. East straight and turn are set independently: both when both (or neither) are named, otherwise
+       only the named lane. An emergency's lanes may be named in a later clause of its own.
+    """
+
+    def __init__(self):
+        self.last_plan = dict(ALL_RED)
+        self.cycle_index = -1
+
+    def plan_text(self, text: str) -> Dict[str, str]:
+        return self.plan(parse_situation(text))
+
+    def plan(self, situation: Situation) -> Dict[str, str]:
+        if situation.emergency:
+            direction = situation.emergency[0]
+            # An east emergency with no lane named gets both, like the corridor preemption opens
+            plan = self._green(direction, situation.emergency_east_lanes or {"straight", "turn"})
+        elif situation.is_actionable():
+            plan = self._green(self._choose(situation), situation.east_lanes)
+        else:
+            # Nothing to act on, keep the current phase
+            plan = dict(self.last_plan)
+        self.last_plan = plan
+        return dict(plan)
+
+    def _choose(self, situation: Situation) -> str:
+        congested = [d for d in DIRECTIONS if situation.congestion.get(d, 0) > 0]
+        if len(congested) == len(DIRECTIONS):
+            self.cycle_index = (self.cycle_index + 1) % len(DIRECTIONS)
+            return DIRECTIONS[self.cycle_index]
+        self.cycle_index = -1
+        if len(congested) > 1 and "east" in congested:
+            return "east"
+        # max() keeps the first of equally congested directions
+        return max(congested, key=lambda d: situation.congestion[d])
+
+    @staticmethod
+    def _green(direction: str, east_lanes) -> Dict[str, str]:
+        plan = dict(ALL_RED)
+        if direction == "east":
+            lanes = east_lanes or {"straight", "turn"}
+            plan["east_straight"] = "green" if "straight" in lanes else "red"
+            plan["east_turn"] = "green" if "turn" in lanes else "red"
+        else:
+            plan[direction] = "green"
+        return plan
+
+
+def corridor_plan(direction: str) -> Dict[str, str]:
+    """Emergency preemption: every lane of the vehicle's direction green, everything else red"""
+    return SignalPlanner._green(direction, {"straight", "turn"})
+
+
+def is_valid_plan(states: Dict[str, str]) -> bool:
+    """All four lights present, red/green only and at most one direction green"""
+    if set(states) != set(LIGHT_KEYS) or any(value not in ("red", "green") for value in states.values()):
+        return False
+    green_directions = {key.split("_")[0] for key, value in states.items() if value == "green"}
+    return len(green_directions) <= 1
+
+
+def format_plan(states: Dict[str, str]) -> str:
+    return "\n".join(f"{key}: {states[key]}" for key in LIGHT_KEYS)
+
+
+class StubModel:
+    """Offline stand-in for the Gemini model: answers the controller prompt with the rule planner
+
+    The prompt's current lights are where the planner starts from, so a situation it cannot read keeps
+    them, as the controller does with no advisor at all.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt: str):
+        self.calls += 1
+        match = re.search(r"Traffic situation:(.*?)(?:\n\s*\n|Respond with)", prompt, re.S)
+        situation = match.group(1).strip() if match else prompt
+        planner = SignalPlanner()
+        current = dict(re.findall(rf"^\s*({'|'.join(LIGHT_KEYS)}): (red|green)\s*$",
+                                  prompt.split("Traffic situation:")[0], re.M))
+        if set(current) == set(LIGHT_KEYS):
+            planner.last_plan = current
+        return SimpleNamespace(text=format_plan(planner.plan_text(situation)))
+
+
+if __name__ == "__main__":
+    # python planner.py "heavy traffic eastbound turning left"
+    print(format_plan(SignalPlanner().plan_text(" ".join(sys.argv[1:]))))
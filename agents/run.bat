@@ -5,10 +5,8 @@ taskkill /F /IM python.exe /FI "WINDOWTITLE eq traffic*" 2>nul
 REM Wait a moment for processes to close
 timeout /t 2 /nobreak >nul
 
-REM Start each traffic light in a new window with a title
-start "traffic-light-1" cmd /c "poetry run python traffic_light_1.py"
-start "traffic-light-2" cmd /c "poetry run python traffic_light_2.py"
-start "traffic-light-3" cmd /c "poetry run python traffic_light_3.py"
+REM Start the light host, it serves every head in light_host.json
+start "traffic-light-host" cmd /c "poetry run python traffic_light_host.py"
 
 REM Wait for traffic lights to initialize
 timeout /t 2 /nobreak >nul
@@ -22,5 +20,6 @@ echo   - Set lights: curl -X POST http://localhost:5052/lights -H "Content-Type:
 echo   - Check north: curl http://localhost:5052/north
 echo   - Check east:  curl http://localhost:5052/east
 echo   - Check west:  curl http://localhost:5052/west
+echo   - Light changes stream: curl -N http://localhost:5054/events
 echo.
 echo To stop the system, run: stop.bat
\ No newline at end of file
@@ -12,6 +12,7 @@ trap cleanup SIGTERM SIGINT SIGQUIT
 
 # Kill any existing Python processes running our agents
 echo "Killing any existing agents..."
+pkill -f "python traffic_light_host.py"
 pkill -f "python traffic_light_1.py"
 pkill -f "python traffic_light_2.py"
 pkill -f "python traffic_light_3.py"
@@ -26,10 +27,8 @@ run_agent() {
     poetry run python "$1" &
 }
 
-# Start all agents
-run_agent "traffic_light_1.py"
-run_agent "traffic_light_2.py"
-run_agent "traffic_light_3.py"
+# Start all agents: one light host serves every head in light_host.json
+run_agent "traffic_light_host.py"
 run_agent "controller_agent.py"
 
 echo "All agents started. Press Ctrl+C to stop all agents..."
@@ -0,0 +1,447 @@
+"""Synthetic city traffic for load-testing the signal planner, the controller and the light hosts
+
+offline - every intersection runs a queue model with random arrivals. Each planner controls its own copy
+          of the city from the same seed, and the run compares queue length, delay and planning speed.
+live    - writes a topology and light host configs for --intersections intersections, then starts the
+          hosts and the controller (LLM_ADVISOR=stub, so Gemini is never called). Every intersection
+          reports its queues at --rate requests per second in total, to /approach-metrics or, with
+          --endpoint lights, as operator text to /lights. The states in each reply drive the queues.
+
+    python simulate_city.py offline --intersections 500 --duration 3600
+    python simulate_city.py live --intersections 300 --rate 100 --duration 60
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from latency import percentile
+from measure_light_hosts import AGENTS_DIR, stop, wait_for_port
+from planner import ALL_RED, DIRECTIONS, LIGHT_KEYS, SignalPlanner, parse_situation, situation_from_metrics
+
+CONTROLLER_PORT = 5052
+CONTROLLER_SEED = "controller recovery phrase"
+SATURATION_FLOW = 0.5  # Vehicles per second leaving a lane on green, about 1800 an hour
+APPROACH_CAPACITY = 25  # Queued vehicles that fill an approach, for its occupancy
+ARRIVAL_WINDOW = 60.0  # Seconds of arrivals behind the reported arrival rate, like the backend's window
+DEMAND_PERIOD = 900.0  # Seconds for demand to shift between approaches and back
+
+
+def poisson(rng: random.Random, mean: float) -> int:
+    """Knuth's method, fine for the few arrivals per step the simulation draws"""
+    limit, count, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+class IntersectionSim:
+    """Queues of the four lights of one intersection, served by whatever plan was last applied
+
+    Arrivals per lane follow a Poisson process whose rate drifts with a random phase, so the busiest
+    approach changes over the run. A lane that turns green only starts discharging after `clearance`
+    seconds, which is what frequent phase changes cost.
+    """
+
+    def __init__(self, intersection_id: str, rng: random.Random, arrival_rate: float, clearance: float):
+        self.id = intersection_id
+        self.rng = rng
+        self.clearance = clearance
+        # Vehicles per second for each lane; turn lanes get half the demand of through lanes
+        self.rates = {key: arrival_rate / 60 * rng.uniform(0.5, 1.5) * (0.5 if key == "east_turn" else 1.0)
+                      for key in LIGHT_KEYS}
+        self.phases = {key: rng.uniform(0, 2 * math.pi) for key in LIGHT_KEYS}
+        self.queues = {key: 0.0 for key in LIGHT_KEYS}
+        self.states = dict(ALL_RED)
+        self.green_from = {key: 0.0 for key in LIGHT_KEYS}
+        self.arrivals = {direction: deque() for direction in DIRECTIONS}  # (time, count) per approach
+        self.now = 0.0
+        self.arrived = 0
+        self.served = 0
+        self.waiting_seconds = 0.0  # Vehicle-seconds spent queued
+        self.queue_seconds = 0.0  # Integral of the intersection's total queue over time
+        self.max_queue = 0.0
+        self.phase_changes = 0
+
+    def apply(self, states: Dict[str, str]):
+        if not states or states == self.states:
+            return
+        for key in LIGHT_KEYS:
+            if states.get(key) == "green" and self.states.get(key) != "green":
+                self.green_from[key] = self.now + self.clearance
+        self.states = dict(states)
+        self.phase_changes += 1
+
+    def advance(self, seconds: float, step: float = 1.0):
+        while seconds > 1e-9:
+            dt = min(step, seconds)
+            self._step(dt)
+            seconds -= dt
+
+    def _step(self, dt: float):
+        for key in LIGHT_KEYS:
+            demand = self.rates[key] * (1 + 0.5 * math.sin(2 * math.pi * self.now / DEMAND_PERIOD + self.phases[key]))
+            count = poisson(self.rng, demand * dt)
+            if count:
+                self.arrived += count
+                self.arrivals[key.split("_")[0]].append((self.now, count))
+                self.queues[key] += count
+            if self.states.get(key) == "green" and self.now >= self.green_from[key]:
+                leaving = min(self.queues[key], SATURATION_FLOW * dt)
+                self.queues[key] -= leaving
+                self.served += leaving
+            self.waiting_seconds += self.queues[key] * dt
+            self.max_queue = max(self.max_queue, self.queues[key])
+        self.queue_seconds += sum(self.queues.values()) * dt
+        self.now += dt
+
+    def approach_queue(self, direction: str) -> float:
+        return sum(queue for key, queue in self.queues.items() if key.split("_")[0] == direction)
+
+    def metrics(self) -> List[dict]:
+        """Per-approach numbers in the shape of the backend's ApproachMetrics"""
+        report = []
+        for direction in DIRECTIONS:
+            window = self.arrivals[direction]
+            while window and window[0][0] < self.now - ARRIVAL_WINDOW:
+                window.popleft()
+            queue = self.approach_queue(direction)
+            report.append({
+                "approach": direction,
+                "camera": f"sim-{self.id}",
+                "direction": direction,
+                "vehicles": int(queue),
+                "queue_length": int(queue),
+                "occupancy": round(min(1.0, queue / APPROACH_CAPACITY), 3),
+                "arrival_rate": round(sum(count for _, count in window) * 60 / ARRIVAL_WINDOW, 2),
+            })
+        return report
+
+    def describe(self, congested: int = 3, heavy: int = 10) -> str:
+        """What an operator would type about these queues, for the controller's /lights"""
+        clauses = []
+        for direction in DIRECTIONS:
+            queue = self.approach_queue(direction)
+            if queue < congested:
+                clauses.append(f"no traffic {direction}bound")
+                continue
+            lanes = ""
+            if direction == "east":
+                straight, turn = self.queues["east_straight"] >= congested, self.queues["east_turn"] >= congested
+                lanes = " going straight" if straight and not turn else " turning left" if turn and not straight else ""
+            clauses.append(f"{'very heavy' if queue >= heavy else 'heavy'} traffic {direction}bound{lanes}")
+        return ", ".join(clauses)
+
+    def summary(self) -> dict:
+        return {
+            "arrived": self.arrived,
+            "served": self.served,
+            "queued": sum(self.queues.values()),
+            "waiting_seconds": self.waiting_seconds,
+            "queue_seconds": self.queue_seconds,
+            "max_queue": self.max_queue,
+            "phase_changes": self.phase_changes,
+            "seconds": self.now,
+        }
+
+
+class RulePolicy:
+    """The controller's /approach-metrics path: rule planner on camera metrics, phases held min_phase seconds"""
+
+    def __init__(self, min_phase: float):
+        self.planner = SignalPlanner()
+        self.min_phase = min_phase
+        self.phase_started = None
+
+    def situation(self, sim: IntersectionSim):
+        return situation_from_metrics(sim.metrics())
+
+    def decide(self, sim: IntersectionSim) -> Optional[Dict[str, str]]:
+        if self.phase_started is not None and sim.now - self.phase_started < self.min_phase:
+            return None
+        states = self.planner.plan(self.situation(sim))
+        if states != sim.states:
+            self.phase_started = sim.now
+        return states
+
+
+class TextPolicy(RulePolicy):
+    """The /lights path: the same planner reading an operator's description of the queues"""
+
+    def situation(self, sim: IntersectionSim):
+        return parse_situation(sim.describe())
+
+
+class FixedTimePolicy:
+    """Baseline without detection: each direction gets `green` seconds in turn"""
+
+    def __init__(self, green: float):
+        self.green = green
+
+    def decide(self, sim: IntersectionSim) -> Optional[Dict[str, str]]:
+        direction = DIRECTIONS[int(sim.now // self.green) % len(DIRECTIONS)]
+        return SignalPlanner._green(direction, {"straight", "turn"})
+
+
+def build_city(count: int, seed: int, arrival_rate: float, clearance: float) -> List[IntersectionSim]:
+    return [IntersectionSim(f"i{index:04d}", random.Random(seed * 100003 + index), arrival_rate, clearance)
+            for index in range(count)]
+
+
+def summarize_city(sims: List[IntersectionSim]) -> dict:
+    totals = [sim.summary() for sim in sims]
+    arrived = sum(total["arrived"] for total in totals)
+    seconds = max(total["seconds"] for total in totals) or 1.0
+    return {
+        "arrived": arrived,
+        "served": round(sum(total["served"] for total in totals)),
+        "still_queued": round(sum(total["queued"] for total in totals)),
+        # Queued vehicle-seconds per arriving vehicle, vehicles still queued at the end count what they waited so far
+        "avg_delay_s": round(sum(total["waiting_seconds"] for total in totals) / arrived, 2) if arrived else 0.0,
+        "avg_queue_per_intersection": round(sum(total["queue_seconds"] for total in totals) / seconds / len(sims), 2),
+        "max_lane_queue": round(max(total["max_queue"] for total in totals), 1),
+        "phase_changes_per_intersection_hour": round(
+            sum(total["phase_changes"] for total in totals) / len(sims) / seconds * 3600, 1),
+    }
+
+
+def summarize_ms(values: List[float]) -> dict:
+    return {"p50_ms": round(percentile(values, 50), 3), "p99_ms": round(percentile(values, 99), 3),
+            "max_ms": round(max(values), 3) if values else 0.0}
+
+
+def run_offline(args) -> dict:
+    policies = {
+        "rules": lambda: RulePolicy(args.min_phase),
+        "text": lambda: TextPolicy(args.min_phase),
+        "fixed": lambda: FixedTimePolicy(args.fixed_green),
+    }
+    result = {"intersections": args.intersections, "simulated_s": args.duration, "planners": {}}
+    for name in args.planners:
+        sims = build_city(args.intersections, args.seed, args.arrival_rate, args.clearance)
+        policy = {sim.id: policies[name]() for sim in sims}
+        decide_ms = []
+        elapsed = 0.0
+        while elapsed < args.duration:
+            for sim in sims:
+                started = time.perf_counter()
+                states = policy[sim.id].decide(sim)
+                if states is not None:
+                    decide_ms.append((time.perf_counter() - started) * 1000)
+                    sim.apply(states)
+                sim.advance(args.control_interval)
+            elapsed += args.control_interval
+        decide_seconds = sum(decide_ms) / 1000
+        result["planners"][name] = {
+            **summarize_city(sims),
+            "decisions": len(decide_ms),
+            "decisions_per_second": round(len(decide_ms) / decide_seconds) if decide_seconds else 0,
+            "decide": summarize_ms(decide_ms),
+        }
+    return result
+
+
+def write_city_config(count: int, hosts: int, base_port: int, workdir: str) -> str:
+    """Topology for `count` intersections, their heads spread over `hosts` light hosts; returns its path"""
+    host_configs = [{
+        "name": f"simulated_light_host_{index}",
+        "seed": f"simulated light host {index} recovery phrase",
+        "port": base_port + index,
+        "peers": [{"seed": CONTROLLER_SEED, "endpoint": f"http://localhost:{CONTROLLER_PORT}/submit"}],
+        "heads": {},
+    } for index in range(hosts)]
+    intersections = {}
+    for index in range(count):
+        intersection_id = f"i{index:04d}"
+        host = host_configs[index % hosts]
+        endpoint = f"http://localhost:{host['port']}/submit"
+        heads = {}
+        for head, turn_key in (("north", None), ("east", "east_turn"), ("west", None)):
+            name = f"{intersection_id}_{head}"
+            host["heads"][name] = {"turn": turn_key is not None}
+            heads[head] = {"seed": host["seed"], "head": name,
+                           "color": "east_straight" if head == "east" else head, "endpoint": endpoint}
+            if turn_key:
+                heads[head]["turn_color"] = turn_key
+        intersections[intersection_id] = {"heads": heads}
+
+    for host in host_configs:
+        with open(os.path.join(workdir, f"{host['name']}.json"), "w") as f:
+            json.dump(host, f, indent=2)
+    topology_path = os.path.join(workdir, "topology.json")
+    with open(topology_path, "w") as f:
+        json.dump({"default_intersection": "i0000", "intersections": intersections}, f, indent=2)
+    return topology_path
+
+
+def start_agent(script_args: List[str], port: int, env: dict, workdir: str, log_name: str, timeout: float):
+    log = open(os.path.join(workdir, log_name), "w")
+    process = subprocess.Popen([sys.executable] + script_args, cwd=workdir, env=env, stdout=log,
+                               stderr=subprocess.STDOUT)
+    try:
+        wait_for_port(port, process, timeout)
+    except BaseException:
+        process.kill()
+        raise
+    return process
+
+
+def request_json(url: str, payload: dict = None, timeout: float = 10.0) -> dict:
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+def drive(args, sims: List[IntersectionSim]) -> dict:
+    """Send every intersection's report once per city tick, spread over the tick, and apply the replies"""
+    base = f"http://localhost:{CONTROLLER_PORT}"
+    url = f"{base}/lights" if args.endpoint == "lights" else f"{base}/approach-metrics"
+    tick = len(sims) / args.rate  # Seconds between two reports of one intersection
+    lock = threading.Lock()
+    replies: Dict[str, dict] = {}
+    in_flight = set()
+    round_trip, command = [], []
+    counts = {"sent": 0, "skipped_in_flight": 0, "errors": 0, "replanned": 0, "unconfirmed_heads": 0}
+
+    def post(sim: IntersectionSim, payload: dict):
+        started = time.perf_counter()
+        try:
+            reply = request_json(url, payload, timeout=args.request_timeout)
+        except Exception:
+            reply = None
+        ms = (time.perf_counter() - started) * 1000
+        with lock:
+            in_flight.discard(sim.id)
+            if reply is None:
+                counts["errors"] += 1
+                return
+            round_trip.append(ms)
+            # /lights commands every head on every request, /approach-metrics only when the phase changes
+            if args.endpoint == "lights" or reply.get("replanned"):
+                command.append(ms)
+                counts["replanned"] += 1
+            counts["unconfirmed_heads"] += len(reply.get("unconfirmed", []))
+            replies[sim.id] = reply
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        next_send = started
+        while time.perf_counter() - started < args.duration:
+            for sim in sims:
+                with lock:
+                    reply = replies.pop(sim.id, None)
+                    busy = sim.id in in_flight
+                if reply and reply.get("states"):
+                    sim.apply(reply["states"])
+                sim.advance(tick)
+                if busy:
+                    # The previous report is still waiting for the controller, it is saturated
+                    counts["skipped_in_flight"] += 1
+                else:
+                    if args.endpoint == "lights":
+                        payload = {"text": sim.describe(), "intersection": sim.id}
+                    else:
+                        payload = {"intersection": sim.id, "sent_at": time.time(),
+                                   "approaches": [dict(m, detected_at=time.time()) for m in sim.metrics()]}
+                    with lock:
+                        in_flight.add(sim.id)
+                    counts["sent"] += 1
+                    pool.submit(post, sim, payload)
+                next_send += tick / len(sims)
+                time.sleep(max(0.0, next_send - time.perf_counter()))
+        send_window = time.perf_counter() - started
+    # Leaving the pool waits for the last replies
+    wall = time.perf_counter() - started
+
+    return {
+        **counts,
+        "target_rate": args.rate,
+        "wall_s": round(wall, 2),
+        "send_window_s": round(send_window, 2),
+        "decisions_per_second": round(len(round_trip) / wall, 1),
+        "round_trip": summarize_ms(round_trip),
+        "command": summarize_ms(command),
+        "traffic": summarize_city(sims),
+        "signal_latency": request_json(f"{base}/signal-latency"),
+        "decision_stats": request_json(f"{base}/decision-stats"),
+    }
+
+
+def run_live(args) -> dict:
+    # Agents write their state files into the working directory, keep them out of the repo
+    workdir = args.workdir or tempfile.mkdtemp(prefix="city-sim-")
+    os.makedirs(workdir, exist_ok=True)
+    topology_path = write_city_config(args.intersections, args.hosts, args.base_port, workdir)
+    env = dict(os.environ, TOPOLOGY_PATH=topology_path, LLM_ADVISOR="stub", MIN_PHASE_SECONDS=str(args.min_phase),
+               LIGHT_STATE_PATH=os.path.join(workdir, "light_state.json"), LIGHT_STREAM_PORT=str(args.stream_port),
+               PYTHONPATH=AGENTS_DIR)
+
+    processes = []
+    try:
+        for index in range(args.hosts):
+            processes.append(start_agent(
+                [os.path.join(AGENTS_DIR, "traffic_light_host.py"), "--config",
+                 os.path.join(workdir, f"simulated_light_host_{index}.json")],
+                args.base_port + index, env, workdir, f"light_host_{index}.log", args.startup_timeout))
+        processes.append(start_agent([os.path.join(AGENTS_DIR, "controller_agent.py")], CONTROLLER_PORT, env,
+                                     workdir, "controller.log", args.startup_timeout))
+        sims = build_city(args.intersections, args.seed, args.arrival_rate, args.clearance)
+        result = drive(args, sims)
+    finally:
+        stop(processes)
+    return {"intersections": args.intersections, "light_hosts": args.hosts, "endpoint": args.endpoint,
+            "workdir": workdir, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic city traffic for the signal planner and agents")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    offline = sub.add_parser("offline", help="compare planners on simulated queues, no agents")
+    live = sub.add_parser("live", help="drive a local controller and light hosts")
+    for mode in (offline, live):
+        mode.add_argument('--intersections', type=int, default=300)
+        mode.add_argument('--seed', type=int, default=1)
+        mode.add_argument('--arrival-rate', type=float, default=6.0, help="mean vehicles per minute per through lane")
+        mode.add_argument('--clearance', type=float, default=3.0, help="seconds before a new green discharges")
+        mode.add_argument('--min-phase', type=float, default=10.0, help="seconds a phase is held, MIN_PHASE_SECONDS")
+        mode.add_argument('--output', default=None, help="write the JSON result here")
+
+    offline.add_argument('--duration', type=float, default=3600.0, help="simulated seconds")
+    offline.add_argument('--control-interval', type=float, default=2.0, help="simulated seconds between decisions")
+    offline.add_argument('--fixed-green', type=float, default=20.0, help="green seconds per direction, fixed planner")
+    offline.add_argument('--planners', nargs="+", default=["rules", "text", "fixed"],
+                         choices=["rules", "text", "fixed"])
+
+    live.add_argument('--endpoint', choices=["metrics", "lights"], default="metrics")
+    live.add_argument('--rate', type=float, default=100.0, help="requests per second across all intersections")
+    live.add_argument('--duration', type=float, default=60.0, help="seconds of load")
+    live.add_argument('--concurrency', type=int, default=32, help="requests in flight at most")
+    live.add_argument('--request-timeout', type=float, default=10.0)
+    live.add_argument('--hosts', type=int, default=1, help="light host processes sharing the heads")
+    live.add_argument('--base-port', type=int, default=5060, help="port of the first light host")
+    live.add_argument('--stream-port', type=int, default=5055, help="controller's LIGHT_STREAM_PORT")
+    live.add_argument('--startup-timeout', type=float, default=120.0)
+    live.add_argument('--workdir', default=None, help="configs, state files and agent logs, default a temp dir")
+    args = parser.parse_args()
+
+    result = run_offline(args) if args.mode == "offline" else run_live(args)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
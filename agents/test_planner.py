@@ -0,0 +1,56 @@
+from planner import SignalPlanner, StubModel, format_plan, parse_situation
+
+
+def congested(text):
+    return set(parse_situation(text).congestion)
+
+
+def test_light_traffic_is_clear():
+    assert congested("Traffic is light in all directions") == set()
+    assert congested("north is light and west is jammed") == {"west"}
+
+
+def test_traffic_alone_is_not_congestion():
+    assert congested("traffic on the north approach") == set()
+    assert congested("lots of traffic north") == {"north"}
+
+
+def test_negated_congestion_is_clear():
+    assert congested("north is not heavy") == set()
+    assert congested("north isn't backed up but west is jammed") == {"west"}
+
+
+def test_no_congestion_does_not_win_the_green():
+    assert congested("no congestion northbound, heavy traffic west") == {"west"}
+    assert SignalPlanner().plan_text("no congestion northbound, heavy traffic west")["west"] == "green"
+
+
+def test_flowing_freely_is_clear():
+    assert congested("north flowing freely, east backed up") == {"east"}
+
+
+def test_negated_emergency_is_ignored():
+    situation = parse_situation("no ambulance north, east is busy")
+    assert situation.emergency == []
+    assert set(situation.congestion) == {"east"}
+    assert parse_situation("ambulance coming from the west").emergency == ["west"]
+
+
+def test_lights_are_not_light_traffic():
+    assert congested("the north lights are backed up") == {"north"}
+
+
+def test_emergency_lane_in_its_own_clause():
+    plan = SignalPlanner().plan_text("Ambulance approaching from the east, needs to turn left")
+    assert (plan["east_turn"], plan["east_straight"]) == ("green", "red")
+
+
+def test_unlaned_east_emergency_gets_both_lanes():
+    plan = SignalPlanner().plan_text("fire truck coming from the east")
+    assert (plan["east_turn"], plan["east_straight"]) == ("green", "green")
+
+
+def test_stub_keeps_the_current_lights_it_cannot_change():
+    current = SignalPlanner().plan_text("heavy traffic west")
+    prompt = f"Current lights:\n{format_plan(current)}\n\nTraffic situation: the weather is nice\n\nRespond with"
+    assert StubModel().generate_content(prompt).text == format_plan(current)
@@ -0,0 +1,74 @@
+import json
+import os
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+TOPOLOGY_PATH = os.getenv('TOPOLOGY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'topology.json'))
+
+
+@dataclass
+class SignalHead:
+    """One light agent and the plan keys that drive its straight and turn phases"""
+    id: str
+    address: str
+    color_key: str
+    turn_key: Optional[str] = None  # None for straight-only heads, their turn phase stays red
+    host_head: Optional[str] = None  # Name of the head at a light host, None for single-light agents
+    endpoint: Optional[str] = None  # Submit URL of its agent, saves an almanac lookup per command
+
+    def colors(self, states: Dict[str, str]) -> Tuple[str, str]:
+        turn_color = states.get(self.turn_key, "red") if self.turn_key else "red"
+        return states.get(self.color_key, "red"), turn_color
+
+
+@dataclass
+class Intersection:
+    id: str
+    heads: List[SignalHead] = field(default_factory=list)
+
+    def head(self, head_id: str) -> SignalHead:
+        for head in self.heads:
+            if head.id == head_id:
+                return head
+        raise KeyError(f"Unknown signal head {head_id!r} at intersection {self.id!r}")
+
+
+@lru_cache(maxsize=None)
+def address_from_seed(seed: str) -> str:
+    # All heads of a light host share its seed, derive the key once
+    from uagents.crypto import Identity
+    return Identity.from_seed(seed, 0).address
+
+
+def resolve_address(entry: dict) -> str:
+    """A head is addressed directly or by the seed its agent runs with"""
+    if entry.get("address"):
+        return entry["address"]
+    if entry.get("seed"):
+        return address_from_seed(entry["seed"])
+    raise ValueError(f"Signal head needs an address or a seed: {entry}")
+
+
+def load_topology(path: str = TOPOLOGY_PATH) -> Tuple[Dict[str, Intersection], str]:
+    """Read the intersection table, returns the intersections by id and the default intersection id"""
+    with open(path, "r") as f:
+        table = json.load(f)
+
+    intersections = {}
+    for intersection_id, config in table["intersections"].items():
+        heads = [
+            SignalHead(id=head_id, address=resolve_address(entry), color_key=entry["color"],
+                       turn_key=entry.get("turn_color"), host_head=entry.get("head"),
+                       endpoint=entry.get("endpoint"))
+            for head_id, entry in config["heads"].items()
+        ]
+        intersections[intersection_id] = Intersection(id=intersection_id, heads=heads)
+    default = table.get("default_intersection") or next(iter(intersections))
+    return intersections, default
+
+
+def known_endpoints(intersections: Dict[str, Intersection]) -> Dict[str, str]:
+    """Agent address -> submit URL for every head that has its endpoint in the table"""
+    return {head.address: head.endpoint for intersection in intersections.values()
+            for head in intersection.heads if head.endpoint}
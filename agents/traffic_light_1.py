@@ -1,17 +1,9 @@
-from uagents import Agent, Context, Model
+from uagents import Agent, Context
 from uagents.setup import fund_agent_if_low
-import json
-from pathlib import Path
 
-class ControllerMessage(Model):
-    text: str
-    color: str
-    turn_color: str = "red"  # Default to red for left turn, needed for schema compatibility
+from messages import ControllerMessage, LightAck
 
 async def update_light_color(ctx: Context, color: str):
-    state = {"color": color}
-    with open("light1.json", "w") as f:
-        json.dump(state, f)
     ctx.logger.info(f"Updated traffic light state to: {color}")
 
 traffic_light = Agent(
@@ -32,10 +24,8 @@ async def handle_controller_message(ctx: Context, sender: str, msg: ControllerMe
         color = "red"
     
     await update_light_color(ctx, color)
+    if msg.command_id:
+        await ctx.send(sender, LightAck(command_id=msg.command_id, color=color))
 
 if __name__ == "__main__":
-    # Initialize the JSON file if it doesn't exist
-    if not Path("light1.json").exists():
-        update_light_color(ctx=None, color="red")
-    
     traffic_light.run()
@@ -1,22 +1,10 @@
-from uagents import Agent, Context, Model
+from uagents import Agent, Context
 from uagents.setup import fund_agent_if_low
-import json
-from pathlib import Path
 
-class ControllerMessage(Model):
-    text: str
-    color: str
-    turn_color: str = "red"  # Default to red for left turn
+from messages import ControllerMessage, LightAck
 
 async def update_light_color(ctx: Context, color: str, turn_color: str):
-    state = {
-        "straight": color,
-        "left_turn": turn_color
-    }
-    with open("light2.json", "w") as f:
-        json.dump(state, f)
-    if ctx is not None:
-        ctx.logger.info(f"Updated traffic light state - Straight: {color}, Left Turn: {turn_color}")
+    ctx.logger.info(f"Updated traffic light state - Straight: {color}, Left Turn: {turn_color}")
 
 traffic_light = Agent(
     name="traffic_light_2",
@@ -42,10 +30,8 @@ async def handle_controller_message(ctx: Context, sender: str, msg: ControllerMe
         turn_color = "red"
     
     await update_light_color(ctx, color, turn_color)
+    if msg.command_id:
+        await ctx.send(sender, LightAck(command_id=msg.command_id, color=color, turn_color=turn_color))
 
 if __name__ == "__main__":
-    # Initialize the JSON file if it doesn't exist
-    if not Path("light2.json").exists():
-        update_light_color(ctx=None, color="red", turn_color="red")
-    
     traffic_light.run()
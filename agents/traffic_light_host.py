@@ -0,0 +1,98 @@
+"""Serve many signal heads from one uAgents process
+
+Every head listed in the config shares the host's agent, port and event loop. The controller
+addresses a head by putting its name in ControllerMessage.head, see topology.json.
+
+    python traffic_light_host.py                    # light_host.json
+    python traffic_light_host.py --config grid.json
+"""
+import argparse
+import json
+import os
+
+from uagents import Agent, Context
+
+from light_state import write_json_atomic
+from messages import ControllerMessage, LightAck, LocalFirstResolver
+from topology import resolve_address
+
+CONFIG_PATH = os.getenv('LIGHT_HOST_CONFIG', 'light_host.json')
+DEFAULT_PORT = 5056  # Clear of the per-light agents (5050, 5051, 5053) so both layouts can run side by side
+
+
+def load_config(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def build_host(config: dict) -> Agent:
+    port = config.get("port", DEFAULT_PORT)
+    host = Agent(
+        name=config.get("name", "traffic_light_host"),
+        seed=config["seed"],
+        port=port,
+        endpoint=[f"http://localhost:{port}/submit"],
+        # Acks to peers with a known endpoint, like the controller, skip the almanac
+        resolve=LocalFirstResolver({resolve_address(peer): peer["endpoint"] for peer in config.get("peers", [])})
+    )
+    snapshot_path = config.get("snapshot_path")
+
+    # head -> current phases; straight-only heads keep their turn phase red
+    heads = {
+        name: {"color": "red", "turn_color": "red", "turn": bool(head.get("turn"))}
+        for name, head in config["heads"].items()
+    }
+    if snapshot_path and os.path.exists(snapshot_path):
+        with open(snapshot_path, "r") as f:
+            for name, state in json.load(f).items():
+                if name in heads:
+                    heads[name].update(color=state["color"], turn_color=state["turn_color"])
+    dirty = {"heads": False}
+
+    @host.on_message(ControllerMessage)
+    async def handle_controller_message(ctx: Context, sender: str, msg: ControllerMessage):
+        name = msg.head
+        if name is None and len(heads) == 1:
+            name = next(iter(heads))
+        head = heads.get(name)
+        if head is None:
+            # No ack, the controller reports the head as unconfirmed
+            ctx.logger.warning(f"Command for unknown head {name!r}")
+            return
+
+        color = msg.color.lower()
+        turn_color = msg.turn_color.lower() if head["turn"] else "red"
+        if color not in ["red", "green"]:
+            ctx.logger.warning(f"Invalid straight color command for {name}: {color}, defaulting to red")
+            color = "red"
+        if turn_color not in ["red", "green"]:
+            ctx.logger.warning(f"Invalid turn color command for {name}: {turn_color}, defaulting to red")
+            turn_color = "red"
+
+        if head["color"] != color or head["turn_color"] != turn_color:
+            head.update(color=color, turn_color=turn_color)
+            dirty["heads"] = True
+            ctx.logger.info(f"{name} - Straight: {color}, Turn: {turn_color}")
+        if msg.command_id:
+            await ctx.send(sender, LightAck(command_id=msg.command_id, color=color, turn_color=turn_color, head=name))
+
+    @host.on_interval(period=1.0)
+    async def snapshot_heads(ctx: Context):
+        # One atomic write for all heads instead of a file per head per command
+        if snapshot_path and dirty["heads"]:
+            dirty["heads"] = False
+            write_json_atomic(snapshot_path, {
+                name: {"color": head["color"], "turn_color": head["turn_color"]} for name, head in heads.items()
+            })
+
+    return host
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host many traffic light heads in one agent")
+    parser.add_argument('--config', default=CONFIG_PATH)
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    print(f"Hosting {len(config['heads'])} signal heads on port {config.get('port', DEFAULT_PORT)}")
+    build_host(config).run()
@@ -0,0 +1,396 @@
+"""Reproducible benchmark for the video pipeline.
+
+Replays a clip through the same stages process_video runs (decode, resize,
+infer, track, annotate, encode, write), then serves /video-feed from a live
+engine to N concurrent pollers. Results are printed and written as JSON so
+runs from different commits can be compared with --compare. --engines repeats
+the stage timings on each inference engine (`python main.py bench` is a
+shortcut for that). --motion-gate also replays the clip with the motion gate
+off and on and checks the counts come out equal.
+
+    python benchmark.py --synthetic --frames 300 --output bench.json
+    python benchmark.py --video street.mp4 --compare bench.json
+    python benchmark.py --video street.mp4 --frames 3000 --motion-gate --pollers 0
+    python benchmark.py --engines torch,onnxruntime,openvino --pollers 0
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+import cv2
+import numpy as np
+import uvicorn
+
+import main
+
+STAGES = ('decode', 'resize', 'infer', 'track', 'annotate', 'encode', 'write')
+# Upper bounds of the latency histogram buckets in milliseconds
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, float('inf'))
+
+
+def make_synthetic_clip(path, frames=300, size=(1280, 720), fps=30, red_frames=0):
+    """Write a clip of boxes driving up and down a road so the benchmark runs without street.mp4
+
+    With red_frames every 90 frames of driving are followed by that many frames of standing still.
+    """
+    width, height = size
+    rng = np.random.default_rng(0)
+    lanes = rng.integers(100, width - 200, size=12)
+    speeds = rng.integers(4, 14, size=12) * rng.choice([-1, 1], size=12)
+    offsets = rng.integers(0, height, size=12)
+    colors = rng.integers(40, 255, size=(12, 3))
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for index in range(frames):
+        frame = np.full((height, width, 3), 90, np.uint8)
+        cv2.line(frame, (width // 2, 0), (width // 2, height), (220, 220, 220), 4)
+        cycle, moved = divmod(index, 90 + red_frames)
+        driven = cycle * 90 + min(moved, 90)
+        for lane, speed, offset, color in zip(lanes, speeds, offsets, colors):
+            y = int((offset + speed * driven) % (height + 160)) - 80
+            cv2.rectangle(frame, (int(lane), y), (int(lane) + 90, y + 150), color.tolist(), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def summarize(values_ms):
+    values = np.asarray(values_ms, dtype=np.float64)
+    if not len(values):
+        return None
+    counts, _ = np.histogram(values, bins=(0,) + BUCKETS_MS)
+    return {
+        'count': int(len(values)),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p90_ms': round(float(np.percentile(values, 90)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+        'histogram': {f"le_{bound:g}": int(count) for bound, count in zip(BUCKETS_MS, counts)}
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def bench_stages(model, video_path, frames, warmup, headless):
+    """Run every pipeline stage back to back on one thread and time each of them"""
+    camera = main.Camera({'id': 'bench', 'video_path': video_path}, on_frame=None, history_store=None)
+    if not camera.open():
+        raise SystemExit(f"Error: Could not open {video_path}")
+    if not headless:
+        # Make the camera believe a viewer is polling so trajectories and overlays are produced
+        camera.frame_cache.last_polled = float('inf')
+
+    out_path = os.path.join(tempfile.mkdtemp(prefix='traffico-bench-'), 'out.mp4')
+    writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*'mp4v'), camera.fps or 30,
+                             (camera.width, camera.height))
+    kwargs = main.predict_kwargs()
+    timings = {stage: [] for stage in STAGES}
+    end_to_end = []
+    started = None
+
+    for frame_index in range(warmup + frames):
+        if frame_index == warmup:
+            # Warm-up frames are excluded from the numbers
+            timings = {stage: [] for stage in STAGES}
+            end_to_end = []
+            started = time.perf_counter()
+
+        t0 = time.perf_counter()
+        ret, frame = camera.cap.read()
+        if not ret:
+            camera.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = camera.cap.read()
+        t1 = time.perf_counter()
+        frame = cv2.resize(frame, (camera.width, camera.height), interpolation=cv2.INTER_LINEAR)
+        t2 = time.perf_counter()
+        result = model.predict([frame], verbose=False,
+                               imgsz=main.CONFIG['adaptive']['initial_size'], **kwargs)[0]
+        t3 = time.perf_counter()
+        camera.track(frame_index, frame, result)
+        _, detections, trails = camera.annotate_queue.get(timeout=0)
+        t4 = time.perf_counter()
+        if not headless:
+            camera.draw_overlay(frame, detections, trails)
+        t5 = time.perf_counter()
+        camera.frame_cache.update(frame)
+        if not headless:
+            camera.frame_cache.get_jpeg()
+        t6 = time.perf_counter()
+        writer.write(frame)
+        t7 = time.perf_counter()
+
+        for stage, elapsed in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5, t7 - t6)):
+            timings[stage].append(elapsed * 1000)
+        end_to_end.append((t7 - t0) * 1000)
+
+    total = time.perf_counter() - started
+    writer.release()
+    camera.cap.release()
+    return {
+        'fps': round(frames / total, 2),
+        'end_to_end': summarize(end_to_end),
+        'stages': {stage: summarize(values) for stage, values in timings.items()},
+        'counts': dict(camera.counts)
+    }
+
+
+def bench_engines(engines, precision, video_path, frames, warmup, headless):
+    """Run the stage benchmark once per inference engine, skipping engines that fail to load"""
+    results = {}
+    for engine_name in engines:
+        try:
+            model = main.load_model(engine_name, precision)
+        except Exception as e:
+            print(f"Skipping {engine_name}: {e}")
+            continue
+        results[engine_name] = bench_stages(model, video_path, frames, warmup, headless)
+    return results
+
+
+def print_engines(results):
+    stages = ('decode', 'resize', 'infer', 'track')
+    print(f"\n{'engine':<12}{'fps':>8}" + ''.join(f"{stage + ' ms':>20}" for stage in stages))
+    print(f"{'':<12}{'':>8}" + ''.join(f"{'mean / p90':>20}" for _ in stages))
+    for engine_name, pipeline in results.items():
+        print(f"{engine_name:<12}{pipeline['fps']:>8.1f}"
+              + ''.join(f"{pipeline['stages'][stage]['mean_ms']:>12.2f} / {pipeline['stages'][stage]['p90_ms']:<5.1f}"
+                        for stage in stages))
+
+
+def bench_motion_gate(model, video_path, frames):
+    """Replay the clip with the motion gate off and on, comparing counts and the CPU time of the process"""
+    kwargs = main.predict_kwargs()
+    runs = {}
+    for gated in (False, True):
+        camera = main.Camera({'id': 'bench', 'video_path': video_path}, on_frame=None, history_store=None)
+        if not camera.open():
+            raise SystemExit(f"Error: Could not open {video_path}")
+        if not gated:
+            camera.motion_gate = None
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        replayed = 0
+        for frame_index in range(frames):
+            ret, frame = camera.cap.read()
+            if not ret:
+                break  # One pass only, so both runs count the same vehicles
+            replayed += 1
+            frame = cv2.resize(frame, (camera.width, camera.height), interpolation=cv2.INTER_LINEAR)
+            small = camera.motion_gate.downscale(frame) if gated else None
+            # Every frame is due inference so the gate is the only thing skipping the model
+            if camera.is_static(frame_index, small):
+                camera.hold(frame_index, frame)
+            else:
+                result = model.predict([frame], verbose=False,
+                                       imgsz=main.CONFIG['adaptive']['initial_size'], **kwargs)[0]
+                camera.track(frame_index, frame, result)
+            camera.annotate_queue.get(timeout=0)
+        cpu_seconds = time.process_time() - cpu_started
+        camera.cap.release()
+        runs['gated' if gated else 'ungated'] = {
+            'frames': replayed,
+            'frames_static': camera.stats['frames_static'],
+            'cpu_seconds': round(cpu_seconds, 2),
+            'wall_seconds': round(time.perf_counter() - started, 2),
+            'counts': dict(camera.counts),
+            'zones': camera.zone_counts()
+        }
+
+    ungated, gated = runs['ungated'], runs['gated']
+    return {
+        **runs,
+        'static_pct': round(100.0 * gated['frames_static'] / gated['frames'], 1) if gated['frames'] else 0.0,
+        'cpu_saved_pct': round(100.0 * (1 - gated['cpu_seconds'] / ungated['cpu_seconds']), 1)
+                         if ungated['cpu_seconds'] else 0.0,
+        'counts_match': ungated['counts'] == gated['counts'] and ungated['zones'] == gated['zones']
+    }
+
+
+def bench_pollers(model, video_path, pollers, duration, port):
+    """Serve /video-feed from a running engine and measure request latency under concurrent pollers"""
+    main.CONFIG['cameras'] = [{'id': 'bench', 'video_path': video_path}]
+    main.CONFIG['serving']['autostart'] = False  # The engine below is the one being measured
+    main.engine = main.ProcessingEngine(model, main.CONFIG['cameras'], history_store=None)
+    if not main.engine.open():
+        raise SystemExit(f"Error: Could not open {video_path}")
+    main.engine.start()
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host='127.0.0.1', port=port, log_level='warning'))
+    server_thread = threading.Thread(target=server.run, daemon=True)
+    server_thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    url = f"http://127.0.0.1:{port}/video-feed"
+    latencies = [[] for _ in range(pollers)]
+    errors = [0] * pollers
+    camera = main.engine.cameras['bench']
+    output_before = camera.stats['frames_annotated'] + camera.stats['frames_headless']
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def poll(slot):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    response.read()
+                latencies[slot].append((time.perf_counter() - started) * 1000)
+            except Exception:
+                errors[slot] += 1
+
+    threads = [threading.Thread(target=poll, args=(slot,)) for slot in range(pollers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    output_fps = (camera.stats['frames_annotated'] + camera.stats['frames_headless'] - output_before) \
+        / (time.perf_counter() - started)
+    server.should_exit = True
+    server_thread.join(timeout=5)
+    pipeline_stats = main.engine.get_stats()
+    main.engine.stop()
+
+    merged = [value for values in latencies for value in values]
+    return {
+        'pollers': pollers,
+        'duration_s': duration,
+        'requests_per_s': round(len(merged) / duration, 1),
+        'errors': sum(errors),
+        'latency': summarize(merged),
+        # Frames between inferences are interpolated, so output should keep up with the source at any stride
+        'output_rate': {
+            'source_fps': round(camera.fps, 1),
+            'output_fps': round(output_fps, 1),
+            'frame_stride': pipeline_stats['frame_stride']
+        },
+        'pipeline': pipeline_stats
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path):
+    """Print the change of the headline numbers against an earlier result file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def row(name, now, before, higher_is_better=False):
+        if now is None or before in (None, 0):
+            return
+        change = (now - before) / before * 100
+        worse = change < 0 if higher_is_better else change > 0
+        flag = '  <-- regression' if worse and abs(change) > 5 else ''
+        print(f"  {name:<28}{before:>10.2f}{now:>10.2f}{change:>+9.1f}%{flag}")
+
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    row('fps', current['pipeline']['fps'], baseline['pipeline']['fps'], higher_is_better=True)
+    for stage in STAGES:
+        now = current['pipeline']['stages'][stage]
+        before = baseline['pipeline']['stages'].get(stage)
+        if now and before:
+            row(f"{stage} p50 ms", now['p50_ms'], before['p50_ms'])
+    row('peak rss mb', current['peak_rss_mb'], baseline['peak_rss_mb'])
+    if current.get('motion_gate') and baseline.get('motion_gate'):
+        row('gated cpu s', current['motion_gate']['gated']['cpu_seconds'],
+            baseline['motion_gate']['gated']['cpu_seconds'])
+    if current.get('video_feed') and baseline.get('video_feed'):
+        row('video-feed p99 ms', current['video_feed']['latency']['p99_ms'],
+            baseline['video_feed']['latency']['p99_ms'])
+
+
+def main_cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Benchmark the TrafficO video pipeline")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--video', default=None, help="clip to replay, defaults to the first camera's video")
+    source.add_argument('--synthetic', action='store_true', help="generate a clip instead so it runs offline")
+    parser.add_argument('--engine', default=None, help="inference engine, defaults to CONFIG")
+    parser.add_argument('--engines', default=None,
+                        help="comma separated engines to compare stage by stage, e.g. torch,onnxruntime,openvino")
+    parser.add_argument('--precision', default=None, help="precision for every engine, defaults to CONFIG")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--headless', action='store_true', help="skip the annotate and encode work like an unwatched camera")
+    parser.add_argument('--motion-gate', action='store_true',
+                        help="replay the clip with the motion gate off and on and check the counts match")
+    parser.add_argument('--red-frames', type=int, default=0,
+                        help="still frames after every 90 driving frames of the synthetic clip")
+    parser.add_argument('--pollers', type=int, default=8, help="concurrent /video-feed pollers, 0 to skip")
+    parser.add_argument('--poll-seconds', type=float, default=10.0)
+    parser.add_argument('--min-output-ratio', type=float, default=0.9,
+                        help="fail when the served engine outputs fewer than this share of the source frames")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', default=None, help="write the JSON result here")
+    parser.add_argument('--compare', default=None, help="earlier JSON result to compare against")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        video_path = os.path.join(tempfile.mkdtemp(prefix='traffico-bench-'), 'synthetic.mp4')
+        make_synthetic_clip(video_path, frames=max(args.frames, 150), red_frames=args.red_frames)
+    else:
+        video_path = args.video or main.CONFIG['cameras'][0]['video_path']
+
+    model = main.load_model(args.engine, args.precision)
+    result = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat() + "Z",
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'cpus': os.cpu_count()},
+        'config': {
+            'video': 'synthetic' if args.synthetic else video_path,
+            'engine': args.engine or main.CONFIG['inference']['engine'],
+            'precision': args.precision or main.CONFIG['inference']['precision'],
+            'frame_scale': main.CONFIG['frame_scale'],
+            'inference_size': main.CONFIG['adaptive']['initial_size'],
+            'frames': args.frames,
+            'headless': args.headless
+        },
+        'pipeline': bench_stages(model, video_path, args.frames, args.warmup, args.headless)
+    }
+    if args.engines:
+        result['engines'] = bench_engines(args.engines.split(','), args.precision, video_path,
+                                          args.frames, args.warmup, args.headless)
+    if args.motion_gate:
+        result['motion_gate'] = bench_motion_gate(model, video_path, args.frames)
+    if args.pollers > 0:
+        result['video_feed'] = bench_pollers(model, video_path, args.pollers, args.poll_seconds, args.port)
+    result['peak_rss_mb'] = peak_rss_mb()
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.engines:
+        print_engines(result['engines'])
+    if args.compare:
+        compare(result, args.compare)
+    if args.pollers > 0:
+        rate = result['video_feed']['output_rate']
+        if rate['output_fps'] < args.min_output_ratio * rate['source_fps']:
+            raise SystemExit(f"Error: output {rate['output_fps']} fps is under {args.min_output_ratio:.0%} "
+                             f"of the {rate['source_fps']} fps source at stride {rate['frame_stride']}")
+
+
+if __name__ == "__main__":
+    main_cli()
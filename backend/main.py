@@ -1,24 +1,47 @@
-from fastapi import FastAPI, Response
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import cv2
 import numpy as np
-from ultralytics import YOLO
-from collections import defaultdict
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from queue import SimpleQueue
 import asyncio
 import signal
 import sys
 import json
 import time
-from datetime import datetime
+import threading
+import urllib.request
+import math
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import sqlite3
+import shutil
+from bisect import bisect_left
+from datetime import datetime, timezone
 import os
 import uvicorn
 
 # Configuration
 CONFIG = {
-    'video_path': 'street.mp4',
+    'cameras': [
+        # The first camera also backs the legacy /video-feed and /traffic-data routes
+        # approaches: counted direction -> approach of the intersection it feeds, see 'controller'
+        # zones: optional lane polygons in fractions of the frame, counted per lane and per movement
+        #   (first entry zone -> exit zone), e.g.
+        #   'zones': {'nb_left': {'polygon': [[0.1, 0.7], [0.3, 0.7], [0.3, 1.0], [0.1, 1.0]]},
+        #             'wb_exit': {'polygon': [[0.0, 0.2], [0.2, 0.2], [0.2, 0.4], [0.0, 0.4]], 'type': 'exit'}}
+        {'id': 'cam1', 'video_path': 'street.mp4', 'approaches': {'northbound': 'north'}}
+    ],
     'model_path': 'yolov8n.pt',
-    'output_path': 'output.mp4',
+    'inference': {
+        'engine': os.getenv('TRAFFICO_ENGINE', 'torch'),  # torch, onnxruntime or openvino
+        'precision': os.getenv('TRAFFICO_PRECISION', 'fp32'),  # fp32, fp16 (openvino) or int8
+        'export_dir': 'models',  # Exported models are cached here after the first startup
+        'calibration_data': 'coco8.yaml'  # Dataset used to calibrate OpenVINO INT8 exports
+    },
     'frame_scale': 0.4,  # Scale down frames to 40% of original size
     'counting_line_position': 0.6,  # Counting line at 60% of frame height
     'tracker_config': {
@@ -35,11 +58,107 @@ CONFIG = {
         3: 'motorcycle',
         5: 'bus',
         7: 'truck'
+    },
+    'pipeline': {
+        'decode_queue_size': 2,  # Decoded frames waiting for inference
+        'annotate_queue_size': 2,  # Inferred frames waiting for annotation
+        'realtime': True,  # Pace decoding to the source FPS like a live camera
+        'max_batch_size': 8  # Most camera frames sent through one model call
+    },
+    'history': {
+        'length': 30,  # Centroids kept per track for the trajectory overlay
+        'max_tracks': 512,  # Ring buffer slots per camera
+        # Evict tracks not seen for this many tracker updates, counted per inference so frame stride does not
+        # shorten it; never below ByteTrack's lost-track buffer, a re-found track would be counted again
+        'max_age_updates': 90
+    },
+    'adaptive': {
+        'enabled': True,
+        'target_latency_ms': 80,  # Inference latency the controller tries to hold
+        'inference_sizes': [640, 512, 416, 320, 256],  # Model input sizes, largest first
+        'initial_size': 640,
+        'max_stride': 4,  # Infer at least every 4th frame, interpolate the rest
+        'step_up_ratio': 0.6,  # Only raise the input size when latency is well under target
+        'cooldown_batches': 15  # Batches to wait between input size changes
+    },
+    'motion_gate': {
+        # Frames that barely differ from the last inferred one reuse its detections instead of going through the model
+        'enabled': os.getenv('TRAFFICO_MOTION_GATE', '1') == '1',
+        'width': 160,  # Frames are compared in grayscale at this width
+        'pixel_threshold': 25,  # Gray levels a pixel has to change by to count as changed
+        'min_changed_ratio': 0.002,  # Share of changed pixels below which the frame counts as static
+        'max_static_frames': 60  # Source frames between forced inferences, so slow drift still reaches the tracker
+    },
+    'history_store': {
+        'path': 'traffic_history.db',
+        'flush_interval': 1.0,  # Seconds between writes of the in-memory per-second bins
+        # Rollup resolution in seconds -> how long its rows are kept
+        'retention_seconds': {1: 2 * 86400, 60: 90 * 86400, 900: 5 * 365 * 86400}
+    },
+    'serving': {
+        # More than one worker moves processing into its own process; frames reach the workers through shared memory
+        'workers': int(os.getenv('TRAFFICO_WORKERS', '1')),
+        'autostart': os.getenv('TRAFFICO_AUTOSTART', '1') == '1',  # Start processing with the server, not only on /start
+        'shm_prefix': 'traffico',  # Shared memory segment of each camera: <prefix>-<camera id>
+        'shm_slots': 4,  # Frames kept per camera, a reader only retries when the writer laps the whole ring
+        'poll_interval': 0.005,  # Seconds between checks of the rings for new frames to push to streams
+        'stats_interval': 1.0  # Seconds between the engine stats and metrics the processing process shares
+    },
+    'viewer_timeout': 5.0,  # Seconds after the last /video-feed poll that a camera still counts as watched
+    'recording': {
+        'enabled': False,  # Record every camera from startup, otherwise use the /recording routes
+        'output_dir': 'recordings',
+        'segment_minutes': 5,
+        'max_segments': 12,  # Oldest segments of a camera are deleted past this many
+        'queue_size': 30
+    },
+    'controller': {
+        # Approach metrics are pushed to the signal controller, which re-plans the light phases from them
+        'enabled': os.getenv('TRAFFICO_CONTROLLER_PUSH', '1') == '1',
+        'url': os.getenv('TRAFFICO_CONTROLLER_URL', 'http://localhost:5052/approach-metrics'),
+        'intersection': 'main',
+        'interval': 1.0,  # Seconds between pushes, every camera goes out in the same request
+        'timeout': 2.0,
+        'vehicle_classes': [2, 3, 5, 7],  # Pedestrians do not queue at the light
+        'queue_speed_px': 0.5,  # Tracks slower than this many pixels per source frame are queued
+        'arrival_window': 60.0,  # Seconds of line crossings behind the arrival rate
+        'preempt_url': os.getenv('TRAFFICO_PREEMPT_URL', 'http://localhost:5052/preempt')
+    },
+    'emergency': {
+        # Tracked crops are classified as emergency vehicles, a confirmed one preempts its approach at once
+        'enabled': True,
+        'classifier': os.getenv('TRAFFICO_EMERGENCY_CLASSIFIER', 'lightbar'),  # lightbar or ultralytics
+        'model_path': 'emergency-cls.pt',  # Ultralytics classification model for the ultralytics classifier
+        'emergency_label': 'emergency',  # Its class name for emergency vehicles
+        'classes': [2, 5, 7],  # Detector classes worth checking: car, bus, truck
+        'min_score': 0.5,
+        'confirm_checks': 3,  # Consecutive positive checks before a track preempts
+        'check_every': 3,  # Source frames between checks of the same track
+        'max_crops': 8  # Crops classified per camera frame, the rest wait for the next one
     }
 }
 
+@asynccontextmanager
+async def lifespan(app):
+    """Warm the model and start processing before the first request, stop it again on shutdown"""
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    if serves_shared_frames():
+        threading.Thread(target=pump_shared_frames, name="shared-frames", daemon=True).start()
+    elif CONFIG['serving']['autostart']:
+        try:
+            await asyncio.to_thread(model_pool.get)
+        except Exception as e:
+            # Keep serving the idle frame, /start retries
+            print(f"Error loading the model: {e}")
+        else:
+            await start_video_processing()
+    yield
+    lag_monitor.cancel()
+    if not serves_shared_frames():
+        await stop_processing_task()
+
 # Initialize FastAPI app
-app = FastAPI(title="TrafficO - Video Processing API")
+app = FastAPI(title="TrafficO - Video Processing API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -55,184 +174,2047 @@ app.mount("/static", StaticFiles(directory="."), name="static")
 
 # Global variables
 stop_processing = False
-current_frame = None
+broadcasters = {}
 processing_task = None
-model = None
-traffic_counts = {
-    'northbound': 0,
-    'southbound': 0,
-    'total': 0
-}
+processing_lock = asyncio.Lock()  # Serializes starting and stopping the processing task
+engine = None
+publisher = None
+frame_writer = False  # True in the processing process that fills the shared frame rings
 
 # Create a default black frame
 default_frame = np.zeros((480, 640, 3), dtype=np.uint8)
 cv2.putText(default_frame, "Waiting for video feed...", (50, 240), 
            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-current_frame = default_frame
 
-def signal_handler(sig, frame):
-    """Handle Ctrl+C gracefully"""
-    global stop_processing
-    print("\nStopping video processing...")
-    stop_processing = True
-    sys.exit(0)
+class Histogram:
+    """Fixed-bucket histogram, observe() only bumps preallocated counters so it can stay on in the hot path
 
-def update_descriptions(data):
-    """Update the descriptions.json file with new data"""
-    try:
-        with open('descriptions.json', 'w') as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        print(f"Error updating descriptions.json: {e}")
+    Each histogram is meant to have a single writer thread, which is what makes skipping the lock safe.
+    """
 
-@app.get("/traffic-data")
-async def get_traffic_data():
-    """API endpoint to get current traffic counts"""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Histograms created once per label set, plus scrape-time samples, rendered in Prometheus text format"""
+
+    # Seconds, from sub-millisecond encode/decode work up to multi-second stalls
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self):
+        self.histograms = {}
+        self.help = {}
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS, **labels):
+        """Get or create the histogram for this label set, call once and keep the result"""
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.histograms:
+            self.help[name] = help_text
+            self.histograms[key] = Histogram(buckets)
+        return self.histograms[key]
+
+    def snapshot(self):
+        """The histograms as plain lists, for the processing process to hand its own to the workers"""
+        return [[name, self.help[name], [list(pair) for pair in labels], list(histogram.buckets),
+                 list(histogram.counts), histogram.sum]
+                for (name, labels), histogram in self.histograms.items()]
+
+    def render(self, samples, shared_histograms=()):
+        """Prometheus exposition text for the histograms and (name, type, help, labels, value) samples
+
+        shared_histograms is another process's snapshot(), a series both processes observe is summed.
+        """
+        lines = []
+        histograms = {key: (self.help[key[0]], histogram.buckets, list(histogram.counts), histogram.sum)
+                      for key, histogram in self.histograms.items()}
+        for name, help_text, labels, buckets, counts, total in shared_histograms:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            if key in histograms and list(histograms[key][1]) == list(buckets):
+                _, _, own_counts, own_sum = histograms[key]
+                counts = [own + other for own, other in zip(own_counts, counts)]
+                total += own_sum
+            histograms[key] = (help_text, tuple(buckets), counts, total)
+        described = set()
+
+        def describe(name, kind, help_text):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        def label_text(labels):
+            return ','.join(f'{key}="{value}"' for key, value in labels)
+
+        for (name, labels), (help_text, buckets, counts, total) in sorted(histograms.items()):
+            describe(name, 'histogram', help_text)
+            cumulative = 0
+            for bound, count in zip(buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{name}_bucket{{{label_text(labels + (('le', le),))}}} {cumulative}")
+            prefix = f"{{{label_text(labels)}}}" if labels else ""
+            lines.append(f"{name}_sum{prefix} {total}")
+            lines.append(f"{name}_count{prefix} {cumulative}")
+
+        # Samples of one metric have to be contiguous, keep the first-seen order of names
+        grouped = {}
+        for sample in samples:
+            grouped.setdefault(sample[0], []).append(sample)
+        for name, group in grouped.items():
+            for _, kind, help_text, labels, value in group:
+                describe(name, kind, help_text)
+                prefix = f"{{{label_text(sorted(labels.items()))}}}" if labels else ""
+                lines.append(f"{name}{prefix} {value}")
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+event_loop_lag = metrics.histogram('traffico_event_loop_lag_seconds',
+                                   'How late the event loop woke up a periodic timer')
+
+def stage_histogram(camera_id, stage):
+    return metrics.histogram('traffico_stage_seconds', 'Time spent per frame in each processing stage',
+                             camera=camera_id, stage=stage)
+
+class TrafficHistoryStore:
+    """Append-only SQLite time series of vehicle counts, pre-aggregated into 1s, 1m and 15m rollups
+
+    Counting threads only bump in-memory per-second bins; a writer thread folds them into every
+    rollup table once per flush interval, so queries never scan raw events. Line crossings go to the
+    counts tables and zone movements to their own movements tables, so a vehicle that does both is
+    still one vehicle in the totals.
+    """
+
+    KINDS = ('counts', 'movements')
+
+    def __init__(self, path):
+        self.path = path
+        self.resolutions = sorted(CONFIG['history_store']['retention_seconds'])
+        self._pending = defaultdict(int)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+        conn = self._connect()
+        for kind in self.KINDS:
+            for resolution in self.resolutions:
+                conn.execute(f"""CREATE TABLE IF NOT EXISTS {kind}_{resolution}s (
+                    bucket INTEGER NOT NULL,
+                    camera TEXT NOT NULL,
+                    direction TEXT NOT NULL,
+                    class_id INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, camera, direction, class_id)
+                ) WITHOUT ROWID""")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # Older databases kept zone movements ("entry->exit") among the line crossings
+            for resolution in self.resolutions:
+                conn.execute(f"""INSERT INTO movements_{resolution}s SELECT * FROM counts_{resolution}s
+                                 WHERE direction LIKE '%->%'""")
+                conn.execute(f"DELETE FROM counts_{resolution}s WHERE direction LIKE '%->%'")
+            conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+
+        self._thread = threading.Thread(target=self._flush_loop, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        # WAL lets history queries read while the writer thread appends
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, camera_id, direction, class_id, count=1, timestamp=None, kind='counts'):
+        """Count a line crossing, or with kind='movements' a zone movement named entry->exit"""
+        second = int(timestamp if timestamp is not None else time.time())
+        with self._lock:
+            self._pending[(kind, second, camera_id, direction, class_id)] += count
+
+    def close(self):
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+
+    def _flush_loop(self):
+        conn = self._connect()
+        flushes = 0
+        try:
+            while not self._stop_event.wait(CONFIG['history_store']['flush_interval']):
+                self._flush(conn)
+                flushes += 1
+                if flushes % 600 == 0:
+                    self._prune(conn)
+            self._flush(conn)
+        except Exception as e:
+            print(f"Error writing traffic history: {e}")
+        finally:
+            conn.close()
+
+    def _flush(self, conn):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        if not pending:
+            return
+        with conn:
+            for kind in self.KINDS:
+                for resolution in self.resolutions:
+                    conn.executemany(
+                        f"""INSERT INTO {kind}_{resolution}s (bucket, camera, direction, class_id, count)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT (bucket, camera, direction, class_id)
+                            DO UPDATE SET count = count + excluded.count""",
+                        [(second - second % resolution, camera_id, direction, class_id, count)
+                         for (row_kind, second, camera_id, direction, class_id), count in pending.items()
+                         if row_kind == kind]
+                    )
+
+    def _prune(self, conn):
+        now = int(time.time())
+        with conn:
+            for resolution, keep in CONFIG['history_store']['retention_seconds'].items():
+                for kind in self.KINDS:
+                    conn.execute(f"DELETE FROM {kind}_{resolution}s WHERE bucket < ?", (now - keep,))
+
+    def _fitting_resolution(self, *edges):
+        """Coarsest rollup whose buckets start on every one of the given seconds"""
+        fitting = [r for r in self.resolutions if all(edge % r == 0 for edge in edges)]
+        return max(fitting) if fitting else self.resolutions[0]
+
+    def query(self, camera_id, start, end, bucket):
+        """Counts per bucket between start and end (epoch seconds), answered from the coarsest fitting rollup
+
+        Buckets are aligned to multiples of the bucket size, the first one starts at start and the last one
+        stops at end so no count from outside the range is returned. Zone movements are listed per bucket
+        next to the crossings but are not part of its total or classes.
+        """
+        # Rows still waiting for the writer would otherwise be missing from the latest buckets
+        with self._lock:
+            pending = [(key, count) for key, count in self._pending.items()
+                       if key[2] == camera_id and start <= key[1] < end]
+        resolution = self._fitting_resolution(bucket)
+
+        # The rollup covers whole buckets inside the range, finer tables fill the partial ones at either edge
+        inner_start = -(-start // resolution) * resolution
+        inner_end = end - end % resolution
+        if inner_start >= inner_end:
+            ranges = [(self._fitting_resolution(start, end), start, end)]
+        else:
+            ranges = [(resolution, inner_start, inner_end)]
+            if start < inner_start:
+                ranges.append((self._fitting_resolution(start, inner_start), start, inner_start))
+            if inner_end < end:
+                ranges.append((self._fitting_resolution(inner_end, end), inner_end, end))
+
+        conn = self._connect()
+        try:
+            rows = []
+            for kind in self.KINDS:
+                for table_resolution, range_start, range_end in ranges:
+                    rows += [(kind, *row) for row in conn.execute(
+                        f"""SELECT bucket - bucket % ? AS slot, direction, class_id, SUM(count)
+                            FROM {kind}_{table_resolution}s
+                            WHERE camera = ? AND bucket >= ? AND bucket < ?
+                            GROUP BY slot, direction, class_id""",
+                        (bucket, camera_id, range_start, range_end)
+                    )]
+        finally:
+            conn.close()
+
+        slots = {}
+        for kind, slot, direction, class_id, count in rows + [
+                (kind, second - second % bucket, direction, class_id, count)
+                for (kind, second, _, direction, class_id), count in pending]:
+            entry = slots.setdefault(slot, {'start': max(slot, start), 'total': 0, 'directions': defaultdict(int),
+                                            'classes': defaultdict(int), 'movements': defaultdict(int)})
+            if kind == 'movements':
+                entry['movements'][direction] += count
+                continue
+            class_name = CONFIG['class_names'].get(class_id, 'unknown')
+            entry['total'] += count
+            entry['directions'][direction] += count
+            entry['classes'][class_name] += count
+        return [slots[slot] for slot in sorted(slots)]
+
+history_store = None
+history_store_lock = threading.Lock()
+
+def get_history_store():
+    """Open the history store on first use so startup does not touch the database"""
+    global history_store
+    with history_store_lock:
+        if history_store is None:
+            history_store = TrafficHistoryStore(CONFIG['history_store']['path'])
+        return history_store
+
+class FrameQueue:
+    """Bounded hand-off queue between pipeline stages that drops the oldest item when full"""
+
+    def __init__(self, maxsize, on_put=None):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._on_put = on_put
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        if self._on_put is not None:
+            self._on_put()
+
+    def get(self, timeout=None):
+        """Return the oldest item, or None on timeout or once the queue is closed and empty"""
+        with self._cond:
+            if not self._items and not self._closed and timeout != 0:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class FrameBroadcaster:
+    """Fans each encoded frame out to every stream subscriber, skipping frames for slow clients"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.skipped = 0
+        self.loop = None
+
+    def has_subscribers(self):
+        return bool(self.subscribers)
+
+    def subscribe(self):
+        """Register a subscriber, must be called from the event loop"""
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=1)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, frame_bytes):
+        """Hand a new frame to the subscribers, safe to call from any thread"""
+        if self.subscribers and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._fan_out, frame_bytes)
+
+    def _fan_out(self, frame_bytes):
+        for queue in self.subscribers:
+            if queue.full():
+                # The client has not taken the previous frame yet, replace it
+                queue.get_nowait()
+                self.skipped += 1
+            queue.put_nowait(frame_bytes)
+
+def get_broadcaster(camera_id):
+    if camera_id not in broadcasters:
+        broadcasters[camera_id] = FrameBroadcaster()
+    return broadcasters[camera_id]
+
+def encode_jpeg(frame, quality=90):
+    """Encode a BGR frame the way the dashboard expects it"""
+    # Convert BGR to RGB (OpenCV uses BGR, web uses RGB)
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    _, buffer = cv2.imencode('.jpg', rgb_frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+def encode_variant(frame, quality, scale):
+    if scale != 1.0:
+        height, width = frame.shape[:2]
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return encode_jpeg(frame, quality)
+
+
+class FrameCache:
+    """Latest frame of a camera, stamped with a sequence number, plus lazily encoded JPEG variants"""
+
+    def __init__(self, name, frame):
+        self.name = name
+        # Distinguishes sequence numbers of different runs so ETags never collide after a restart
+        self.epoch = f"{int(time.time() * 1000):x}"
+        self.encodes = 0
+        self.encode_seconds = metrics.histogram('traffico_jpeg_encode_seconds',
+                                                'Time to encode one JPEG variant of a frame', camera=name)
+        self.last_polled = float('-inf')
+        self._current = (0, frame, {})
+        self._encode_lock = threading.Lock()
+
+    @property
+    def seq(self):
+        return self._current[0]
+
+    @property
+    def frame(self):
+        return self._current[1]
+
+    def update(self, frame):
+        """Publish a new frame, only called from the camera's annotate thread"""
+        # Swap the whole tuple so readers never see a frame paired with another frame's variants
+        self._current = (self._current[0] + 1, frame, {})
+
+    def etag(self, seq, quality, scale):
+        return f'"{self.name}-{self.epoch}-{seq}-q{quality}-s{scale:g}"'
+
+    def get_jpeg(self, quality=90, scale=1.0):
+        """Return (seq, jpeg bytes) for the current frame, encoding each variant at most once per frame"""
+        seq, frame, variants = self._current
+        key = (quality, scale)
+        if key not in variants:
+            with self._encode_lock:
+                if key not in variants:
+                    started = time.perf_counter()
+                    variants[key] = encode_variant(frame, quality, scale)
+                    self.encodes += 1
+                    self.encode_seconds.observe(time.perf_counter() - started)
+        return seq, variants[key]
+
+idle_frame_cache = FrameCache('idle', default_frame)
+
+def attach_shared_memory(name):
+    """Open a segment created by another process without this process unlinking it on exit"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Before 3.13 every attached segment is registered with the resource tracker, which unlinks it when
+    # the worker exits and would pull the frames out from under the other workers
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class SharedFrameRing:
+    """Latest frames of one camera in shared memory, written by the processing process and read by every
+    uvicorn worker without pickling, re-decoding or re-encoding
+
+    Each slot holds the raw annotated frame, its default JPEG (when someone is watching) and the camera's
+    status JSON. The slot's sequence number is written before and after the data, so a reader can tell
+    that the writer lapped the ring while it was copying and retry.
+    """
+
+    HEADER_BYTES = 64  # int64: latest seq, slots, frame bytes, jpeg bytes, epoch, status bytes; float64 watched-until
+    META_BYTES = 48  # int64 per slot: begin seq, height, width, jpeg length, status length, end seq
+    STATUS_BYTES = 4096  # Counts and processing status, zones add room for their lane and movement counts
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((6,), np.int64, shm.buf, 0)
+        self.watched_until = np.ndarray((1,), np.float64, shm.buf, 48)
+        self.slots, self.frame_bytes, self.jpeg_bytes = (int(value) for value in self.header[1:4])
+        self.epoch = f"{int(self.header[4]):x}"
+        self.status_bytes = int(self.header[5])
+        slot_bytes = self.slot_bytes(self.frame_bytes, self.jpeg_bytes, self.status_bytes)
+        self.metas, self.frames, self.jpegs, self.statuses = [], [], [], []
+        for index in range(self.slots):
+            offset = self.HEADER_BYTES + index * slot_bytes
+            self.metas.append(np.ndarray((6,), np.int64, shm.buf, offset))
+            offset += self.META_BYTES
+            self.frames.append(np.ndarray((self.frame_bytes,), np.uint8, shm.buf, offset))
+            offset += self.frame_bytes
+            self.jpegs.append(np.ndarray((self.jpeg_bytes,), np.uint8, shm.buf, offset))
+            self.statuses.append(np.ndarray((self.status_bytes,), np.uint8, shm.buf, offset + self.jpeg_bytes))
+
+    @staticmethod
+    def segment_name(camera_id):
+        return f"{CONFIG['serving']['shm_prefix']}-{camera_id}"
+
+    @classmethod
+    def slot_bytes(cls, frame_bytes, jpeg_bytes, status_bytes):
+        size = cls.META_BYTES + frame_bytes + jpeg_bytes + status_bytes
+        return (size + 63) // 64 * 64  # Keep every slot's int64 metadata aligned
+
+    @classmethod
+    def status_bytes_for(cls, zone_names):
+        """Status room for a camera with these zones: one count per lane and per entry/exit pair"""
+        longest = max((len(name) for name in zone_names), default=0)
+        zones = len(zone_names)
+        # Counts go up to 20 digits, the rest covers quotes, separators and the arrow of a movement
+        return cls.STATUS_BYTES + zones * (longest + 32) + zones * zones * (2 * longest + 36)
+
+    @classmethod
+    def create(cls, camera_id, height, width, epoch, status_bytes=STATUS_BYTES):
+        """Allocate the ring for frames of this size, replacing any segment left over by a crashed run"""
+        slots = CONFIG['serving']['shm_slots']
+        frame_bytes = height * width * 3
+        jpeg_bytes = frame_bytes + 65536  # A JPEG of a noisy frame at high quality can exceed the raw size
+        name = cls.segment_name(camera_id)
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        size = cls.HEADER_BYTES + slots * cls.slot_bytes(frame_bytes, jpeg_bytes, status_bytes)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((6,), np.int64, shm.buf, 0)
+        header[:] = (0, slots, frame_bytes, jpeg_bytes, int(epoch, 16), status_bytes)
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, camera_id):
+        """The camera's ring, or None while the processing process has not created it yet"""
+        try:
+            shm = attach_shared_memory(cls.segment_name(camera_id))
+        except FileNotFoundError:
+            return None
+        if shm.size < cls.HEADER_BYTES or not np.ndarray((6,), np.int64, shm.buf, 0)[1]:
+            shm.close()
+            return None
+        return cls(shm, owner=False)
+
+    @property
+    def seq(self):
+        return int(self.header[0])
+
+    def publish(self, seq, frame, jpeg, status):
+        """Write a frame into the next slot, only called from the camera's annotate thread"""
+        index = seq % self.slots
+        meta = self.metas[index]
+        meta[0] = seq
+        height, width = frame.shape[:2]
+        self.frames[index][:height * width * 3] = np.ascontiguousarray(frame).reshape(-1)
+        jpeg_length = len(jpeg) if jpeg is not None and len(jpeg) <= self.jpeg_bytes else 0
+        if jpeg_length:
+            self.jpegs[index][:jpeg_length] = np.frombuffer(jpeg, np.uint8)
+        if len(status) > self.status_bytes:
+            # A cut-off status would not parse in the workers, the caller has to make it fit
+            raise ValueError(f"Status of {len(status)} bytes does not fit the ring's {self.status_bytes}")
+        self.statuses[index][:len(status)] = np.frombuffer(status, np.uint8)
+        meta[1:5] = (height, width, jpeg_length, len(status))
+        meta[5] = seq
+        self.header[0] = seq
+
+    def read(self, frame=False, jpeg=False, status=False):
+        """(seq, frame, jpeg, status) of the latest slot, parts not asked for are None; None before the first frame"""
+        for _ in range(self.slots):
+            seq = self.seq
+            if seq == 0:
+                return None
+            meta = self.metas[seq % self.slots]
+            if meta[5] != seq:
+                continue  # Still being written
+            height, width, jpeg_length, status_length = (int(value) for value in meta[1:5])
+            frame_copy = (self.frames[seq % self.slots][:height * width * 3].reshape(height, width, 3).copy()
+                          if frame else None)
+            jpeg_bytes = self.jpegs[seq % self.slots][:jpeg_length].tobytes() if jpeg and jpeg_length else None
+            status_bytes = self.statuses[seq % self.slots][:status_length].tobytes() if status else None
+            if meta[0] == seq:
+                return seq, frame_copy, jpeg_bytes, status_bytes
+        return None
+
+    def mark_watched(self, seconds):
+        self.watched_until[0] = max(float(self.watched_until[0]), time.time() + seconds)
+
+    def is_watched(self):
+        return time.time() < self.watched_until[0]
+
+    def get_stats(self):
+        return {'name': self.shm.name, 'seq': self.seq, 'slots': self.slots, 'bytes': self.shm.size}
+
+    def close(self):
+        # Views into the buffer have to go before the segment can be closed
+        self.header = self.watched_until = None
+        self.metas, self.frames, self.jpegs, self.statuses = [], [], [], []
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class SharedFrameCache:
+    """A uvicorn worker's view of a camera's FrameCache, served from the camera's SharedFrameRing"""
+
+    etag = FrameCache.etag
+
+    def __init__(self, name, ring):
+        self.name = name
+        self.ring = ring
+        self.epoch = ring.epoch  # The processing process's epoch, so every worker hands out the same ETags
+        self.encodes = 0
+        self.encode_seconds = metrics.histogram('traffico_jpeg_encode_seconds',
+                                                'Time to encode one JPEG variant of a frame', camera=name)
+        self._variants = (0, {})
+        self._encode_lock = threading.Lock()
+
+    @property
+    def seq(self):
+        return self.ring.seq
+
+    @property
+    def last_polled(self):
+        return time.monotonic() if self.ring.is_watched() else float('-inf')
+
+    @last_polled.setter
+    def last_polled(self, value):
+        # The processing process skips overlays and JPEGs for cameras nobody polls
+        self.ring.mark_watched(CONFIG['viewer_timeout'])
+
+    def get_jpeg(self, quality=90, scale=1.0):
+        if (quality, scale) == (90, 1.0):
+            latest = self.ring.read(jpeg=True)
+            if latest is not None and latest[2] is not None:
+                return latest[0], latest[2]
+        latest = self.ring.read(frame=True)
+        if latest is None:
+            return idle_frame_cache.get_jpeg(quality, scale)
+        seq, frame = latest[:2]
+        # Other variants, and frames written while nobody watched, are encoded here once per frame
+        with self._encode_lock:
+            if self._variants[0] != seq:
+                self._variants = (seq, {})
+            variants = self._variants[1]
+            key = (quality, scale)
+            if key not in variants:
+                started = time.perf_counter()
+                variants[key] = encode_variant(frame, quality, scale)
+                self.encodes += 1
+                self.encode_seconds.observe(time.perf_counter() - started)
+            return seq, variants[key]
+
+
+class SharedCamera:
+    """What a uvicorn worker knows about a camera processed in another process: its frames and latest status"""
+
+    def __init__(self, camera_id, ring):
+        self.id = camera_id
+        self.ring = ring
+        self.frame_cache = SharedFrameCache(camera_id, ring)
+        self.broadcaster = get_broadcaster(camera_id)
+
+    def status(self):
+        latest = self.ring.read(status=True)
+        return json.loads(latest[3]) if latest is not None and latest[3] else {}
+
+    @property
+    def counts(self):
+        return self.status().get('counts', new_counts())
+
+    def processing_status(self):
+        return self.status().get('processing')
+
+    def zone_counts(self):
+        return self.status().get('zones')
+
+    def is_running(self):
+        # The processing process stamps every frame, a stale stamp means it stopped or died
+        return time.time() - self.status().get('updated_at', 0) < CONFIG['viewer_timeout']
+
+
+shared_cameras = {}
+shared_cameras_lock = threading.Lock()
+
+def shared_camera(camera_id):
+    """Attach to a camera's ring on first use, None until the processing process has created it"""
+    with shared_cameras_lock:
+        if camera_id not in shared_cameras:
+            ring = SharedFrameRing.attach(camera_id)
+            if ring is None:
+                return None
+            shared_cameras[camera_id] = SharedCamera(camera_id, ring)
+        return shared_cameras[camera_id]
+
+def serves_shared_frames():
+    """Whether this process is a uvicorn worker serving frames processed in another process"""
+    return CONFIG['serving']['workers'] > 1 and not frame_writer
+
+def pump_shared_frames():
+    """Worker thread: pushes each new frame in the rings to this worker's MJPEG and WebSocket subscribers"""
+    last_seq = {}
+    while True:
+        for cfg in CONFIG['cameras']:
+            broadcaster = get_broadcaster(cfg['id'])
+            if not broadcaster.has_subscribers():
+                continue
+            camera = shared_camera(cfg['id'])
+            if camera is None:
+                continue
+            camera.ring.mark_watched(CONFIG['viewer_timeout'])
+            if camera.ring.seq != last_seq.get(cfg['id']):
+                seq, frame_bytes = camera.frame_cache.get_jpeg()
+                last_seq[cfg['id']] = seq
+                broadcaster.publish(frame_bytes)
+        time.sleep(CONFIG['serving']['poll_interval'])
+
+class SharedStatsBlock:
+    """Engine stats and metrics of the processing process, as JSON in shared memory for the workers' /metrics
+    and /pipeline-stats
+
+    A single slot: the writer stamps its sequence number before and after the JSON, a reader that sees the
+    two differ caught a write in progress and retries.
+    """
+
+    HEADER_BYTES = 24  # int64: begin seq, JSON length, end seq
+    SEGMENT_BYTES = 1 << 20  # Only the pages a write touches are backed by memory
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((3,), np.int64, shm.buf, 0)
+        self.data = np.ndarray((shm.size - self.HEADER_BYTES,), np.uint8, shm.buf, self.HEADER_BYTES)
+
+    @staticmethod
+    def segment_name():
+        return f"{CONFIG['serving']['shm_prefix']}-stats"
+
+    @classmethod
+    def create(cls):
+        """Allocate the block, replacing any segment left over by a crashed run"""
+        try:
+            stale = shared_memory.SharedMemory(name=cls.segment_name())
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=cls.segment_name(), create=True, size=cls.SEGMENT_BYTES)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls):
+        """The block, or None while the processing process has not created it yet"""
+        try:
+            return cls(attach_shared_memory(cls.segment_name()), owner=False)
+        except FileNotFoundError:
+            return None
+
+    def publish(self, payload):
+        """Replace the block's contents, only called from the processing process's event loop"""
+        data = json.dumps(payload).encode()
+        if len(data) > len(self.data):
+            raise ValueError(f"Stats of {len(data)} bytes do not fit the block's {len(self.data)}")
+        seq = int(self.header[2]) + 1
+        self.header[0] = seq
+        self.data[:len(data)] = np.frombuffer(data, np.uint8)
+        self.header[1] = len(data)
+        self.header[2] = seq
+
+    def read(self):
+        """The last published payload, None before the first one or while writes keep overlapping the copy"""
+        for _ in range(3):
+            seq = int(self.header[2])
+            if seq == 0:
+                return None
+            data = self.data[:int(self.header[1])].tobytes()
+            if self.header[0] == seq:
+                return json.loads(data)
+            time.sleep(0.001)
+        return None
+
+    def close(self):
+        self.header = self.data = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+shared_stats_block = None
+shared_stats_lock = threading.Lock()
+
+def shared_stats():
+    """The processing process's last published stats in a worker, None until it published any"""
+    global shared_stats_block
+    with shared_stats_lock:
+        if shared_stats_block is None:
+            shared_stats_block = SharedStatsBlock.attach()
+            if shared_stats_block is None:
+                return None
+    return shared_stats_block.read()
+
+def new_counts():
     return {
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "counts": traffic_counts
+        'northbound': 0,
+        'southbound': 0,
+        'total': 0
     }
 
-async def process_video():
-    """Main video processing function"""
-    global stop_processing, current_frame, model, traffic_counts
-    
-    try:
-        # Load YOLOv8 model
-        model = YOLO(CONFIG['model_path'])
-        
-        # Open video file
-        cap = cv2.VideoCapture(CONFIG['video_path'])
-        
-        if not cap.isOpened():
-            print("Error: Could not open video file")
+def create_tracker(frame_rate):
+    """Create a standalone ByteTrack instance so every camera keeps its own track IDs"""
+    from ultralytics.trackers.byte_tracker import BYTETracker
+    from ultralytics.utils import IterableSimpleNamespace, yaml_load
+    from ultralytics.utils.checks import check_yaml
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(CONFIG['tracker_config']['tracker'])))
+    return BYTETracker(args=cfg, frame_rate=max(1, int(round(frame_rate or 30))))
+
+def predict_kwargs():
+    """Detection arguments from the tracker config, minus the tracker-only keys"""
+    return {key: value for key, value in CONFIG['tracker_config'].items()
+            if key not in ('tracker', 'persist')}
+
+def export_model(export_format, precision):
+    """Export the PyTorch weights once and return the path of the cached artifact"""
+    export_dir = CONFIG['inference']['export_dir']
+    stem = os.path.splitext(os.path.basename(CONFIG['model_path']))[0]
+    if export_format == 'openvino':
+        # Ultralytics recognises OpenVINO models by the _openvino_model directory suffix
+        target = os.path.join(export_dir, f"{stem}_{precision}_openvino_model")
+    else:
+        target = os.path.join(export_dir, f"{stem}_{precision}.onnx")
+    if os.path.exists(target):
+        return target
+
+    print(f"Exporting {CONFIG['model_path']} to {export_format} ({precision}), this only happens once...")
+    os.makedirs(export_dir, exist_ok=True)
+    # Dynamic axes so batched multi-camera frames and adaptive input sizes both work
+    export_args = {'format': export_format, 'dynamic': True}
+    if export_format == 'openvino':
+        export_args['half'] = precision == 'fp16'
+        export_args['int8'] = precision == 'int8'
+        if precision == 'int8':
+            export_args['data'] = CONFIG['inference']['calibration_data']
+    from ultralytics import YOLO
+    exported = YOLO(CONFIG['model_path']).export(**export_args)
+
+    if export_format == 'onnx' and precision == 'int8':
+        # Ultralytics has no INT8 ONNX export, quantize the FP32 graph's weights instead
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(exported, target, weight_type=QuantType.QUInt8)
+        # Only the quantized copy is kept, the FP32 one was written next to the weights
+        os.remove(exported)
+    else:
+        shutil.move(exported, target)
+    return target
+
+# Ultralytics pulls in torch, which takes seconds to import; only processes that run a model pay for it
+def load_torch_model(precision):
+    from ultralytics import YOLO
+    return YOLO(CONFIG['model_path'])
+
+def load_onnxruntime_model(precision):
+    from ultralytics import YOLO
+    return YOLO(export_model('onnx', precision), task='detect')
+
+def load_openvino_model(precision):
+    from ultralytics import YOLO
+    return YOLO(export_model('openvino', precision), task='detect')
+
+# Inference engine name -> (loader, supported precisions)
+INFERENCE_ENGINES = {
+    'torch': (load_torch_model, ('fp32',)),
+    'onnxruntime': (load_onnxruntime_model, ('fp32', 'int8')),
+    'openvino': (load_openvino_model, ('fp32', 'fp16', 'int8'))
+}
+
+def load_model(engine_name=None, precision=None):
+    """Load the detector on the selected inference engine, exporting it on first use"""
+    engine_name = engine_name or CONFIG['inference']['engine']
+    precision = precision or CONFIG['inference']['precision']
+    if engine_name not in INFERENCE_ENGINES:
+        raise ValueError(f"Unknown inference engine: {engine_name}")
+    loader, precisions = INFERENCE_ENGINES[engine_name]
+    if precision not in precisions:
+        raise ValueError(f"{engine_name} does not support {precision}, use one of {', '.join(precisions)}")
+    print(f"Loading {CONFIG['model_path']} on {engine_name} ({precision})")
+    return loader(precision)
+
+
+class LightBarClassifier:
+    """Local stand-in for an emergency vehicle model: flashing light bars show up as saturated red and blue
+    pixels together in the top of the crop"""
+
+    def __init__(self, settings):
+        self.min_fraction = 0.02  # Share of the roof area each colour has to cover for a full score
+
+    def score(self, crops):
+        scores = np.zeros(len(crops))
+        for i, crop in enumerate(crops):
+            roof = crop[:max(1, crop.shape[0] // 3)]
+            if roof.size == 0:
+                continue
+            hsv = cv2.cvtColor(roof, cv2.COLOR_BGR2HSV)
+            bright = (hsv[..., 1] > 150) & (hsv[..., 2] > 150)
+            hue = hsv[..., 0]
+            red = np.count_nonzero(bright & ((hue < 10) | (hue > 170))) / bright.size
+            blue = np.count_nonzero(bright & (hue > 100) & (hue < 130)) / bright.size
+            scores[i] = min(1.0, min(red, blue) / self.min_fraction)
+        return scores
+
+
+class UltralyticsCropClassifier:
+    """Ultralytics classification model trained with an emergency vehicle class"""
+
+    def __init__(self, settings):
+        from ultralytics import YOLO
+        self.model = YOLO(settings['model_path'], task='classify')
+        names = {name: index for index, name in self.model.names.items()}
+        if settings['emergency_label'] not in names:
+            raise ValueError(f"{settings['model_path']} has no {settings['emergency_label']!r} class")
+        self.label_index = names[settings['emergency_label']]
+
+    def score(self, crops):
+        results = self.model.predict(crops, verbose=False)
+        return np.array([float(result.probs.data[self.label_index]) for result in results])
+
+
+# Classifier name -> class, each takes CONFIG['emergency'] and scores a list of BGR crops from 0 to 1
+EMERGENCY_CLASSIFIERS = {
+    'lightbar': LightBarClassifier,
+    'ultralytics': UltralyticsCropClassifier
+}
+
+def load_emergency_classifier(name=None):
+    settings = CONFIG['emergency']
+    if not settings['enabled']:
+        return None
+    name = name or settings['classifier']
+    if name not in EMERGENCY_CLASSIFIERS:
+        raise ValueError(f"Unknown emergency classifier: {name}")
+    print(f"Loading emergency classifier: {name}")
+    return EMERGENCY_CLASSIFIERS[name](settings)
+
+
+class ModelPool:
+    """Detector and emergency classifier, loaded and warmed up once per process and shared by every processing run"""
+
+    def __init__(self):
+        self.model = None
+        self.emergency_classifier = None
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Blocking, run it off the event loop; returns (model, emergency classifier)"""
+        with self._lock:
+            if self.model is None:
+                started = time.perf_counter()
+                model = load_model()
+                emergency_classifier = load_emergency_classifier()
+                loaded = time.perf_counter()
+                self.warm_up(model, emergency_classifier)
+                self.timings = {'model_load_s': round(loaded - started, 3),
+                                'warmup_s': round(time.perf_counter() - loaded, 3)}
+                print(f"Model ready: loaded in {self.timings['model_load_s']}s, warmed up in {self.timings['warmup_s']}s")
+                self.model, self.emergency_classifier = model, emergency_classifier
+            return self.model, self.emergency_classifier
+
+    @staticmethod
+    def warm_up(model, emergency_classifier):
+        """Dummy inference at every input size the adaptive controller can pick, so none of them pays
+        for lazy initialization or graph compilation on a live frame"""
+        sizes = CONFIG['adaptive']['inference_sizes'] if CONFIG['adaptive']['enabled'] \
+            else [CONFIG['adaptive']['initial_size']]
+        kwargs = predict_kwargs()
+        for size in sizes:
+            model.predict([np.zeros((size, size, 3), np.uint8)], verbose=False, imgsz=size, **kwargs)
+        if emergency_classifier is not None:
+            emergency_classifier.score([np.zeros((64, 64, 3), np.uint8)])
+
+model_pool = ModelPool()
+
+
+class RateMeter:
+    """Events per second over the most recent window of events"""
+
+    def __init__(self, window=60):
+        self.times = deque(maxlen=window)
+
+    def tick(self):
+        self.times.append(time.monotonic())
+
+    def rate(self):
+        times = list(self.times)
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+
+class AdaptiveController:
+    """Picks the model input size and frame stride that keep inference on its latency target"""
+
+    def __init__(self):
+        self.config = CONFIG['adaptive']
+        self.sizes = self.config['inference_sizes']
+        self.size_index = self.sizes.index(self.config['initial_size'])
+        self.stride = 1
+        self.latency_ms = None
+        self.batches_since_change = 0
+
+    @property
+    def inference_size(self):
+        return self.sizes[self.size_index]
+
+    def update(self, latency_ms, frame_interval_ms):
+        """Feed one batch latency, then adjust stride and input size"""
+        # Smooth out single slow batches
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms = 0.8 * self.latency_ms + 0.2 * latency_ms
+        if not self.config['enabled']:
             return
-        
-        # Get video properties
-        original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        
-        # Calculate scaled dimensions
-        width = int(original_width * CONFIG['frame_scale'])
-        height = int(original_height * CONFIG['frame_scale'])
-        
-        # Create video writer for output
+
+        # Infer often enough to keep pace with the source, interpolating the frames in between
+        self.stride = min(self.config['max_stride'], max(1, math.ceil(self.latency_ms / frame_interval_ms)))
+
+        self.batches_since_change += 1
+        if self.batches_since_change < self.config['cooldown_batches']:
+            return
+        target = self.config['target_latency_ms']
+        if self.latency_ms > target and self.size_index < len(self.sizes) - 1:
+            self.size_index += 1
+            self.batches_since_change = 0
+        elif self.latency_ms < target * self.config['step_up_ratio'] and self.size_index > 0:
+            self.size_index -= 1
+            self.batches_since_change = 0
+
+    def get_status(self):
+        return {
+            'frame_stride': self.stride,
+            'inference_size': self.inference_size,
+            'inference_latency_ms': round(self.latency_ms, 1) if self.latency_ms is not None else None
+        }
+
+
+class TrackHistory:
+    """Per-track centroid history and crossing flags in preallocated ring buffers indexed by track slot"""
+
+    def __init__(self, max_tracks, length, max_age):
+        self.length = length
+        self.max_age = max_age
+        self.points = np.zeros((max_tracks, length, 2), np.int32)
+        self.heads = np.zeros(max_tracks, np.int64)  # Next write position in each ring
+        self.sizes = np.zeros(max_tracks, np.int64)
+        self.crossed = np.zeros(max_tracks, bool)
+        self.emergency_hits = np.zeros(max_tracks, np.int64)  # Consecutive positive emergency checks
+        self.checked_at = np.zeros(max_tracks, np.int64)  # Frame of the last emergency check
+        self.preempted = np.zeros(max_tracks, bool)
+        self.zones_visited = np.zeros(max_tracks, np.int64)  # Bit per counting zone the track has been in
+        self.entry_zone = np.zeros(max_tracks, np.int64)  # Label of the first entry zone, 0 for none yet
+        self.movement_counted = np.zeros(max_tracks, bool)
+        self.last_seen = np.full(max_tracks, -1, np.int64)  # -1 marks a free slot
+        self.last_update = np.zeros(max_tracks, np.int64)  # Tracker update a track was last seen in
+        self.track_ids = np.full(max_tracks, -1, np.int64)
+        self.slot_of = {}
+        self.free_slots = list(range(max_tracks - 1, -1, -1))
+        self.frame_index = 0
+        self.updates = 0  # Tracker updates so far, ages tracks the way ByteTrack does
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def slots_for(self, track_ids):
+        """Map track IDs to ring slots, allocating slots for new tracks"""
+        slots = np.empty(len(track_ids), np.int64)
+        for i, track_id in enumerate(track_ids.tolist()):
+            slot = self.slot_of.get(track_id)
+            slots[i] = slot if slot is not None else self._allocate(track_id)
+        return slots
+
+    def _allocate(self, track_id):
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            # Every slot is live, recycle the one seen longest ago
+            slot = int(np.argmin(self.last_seen))
+            del self.slot_of[int(self.track_ids[slot])]
+        self.slot_of[track_id] = slot
+        self.track_ids[slot] = track_id
+        self.heads[slot] = 0
+        self.sizes[slot] = 0
+        self.crossed[slot] = False
+        self.emergency_hits[slot] = 0
+        self.checked_at[slot] = self.frame_index - CONFIG['emergency']['check_every']  # Due right away
+        self.preempted[slot] = False
+        self.zones_visited[slot] = 0
+        self.entry_zone[slot] = 0
+        self.movement_counted[slot] = False
+        self.last_seen[slot] = self.frame_index
+        self.last_update[slot] = self.updates
+        return slot
+
+    def append(self, slots, centroids):
+        heads = self.heads[slots]
+        self.points[slots, heads] = centroids
+        self.heads[slots] = (heads + 1) % self.length
+        self.sizes[slots] = np.minimum(self.sizes[slots] + 1, self.length)
+        self.last_seen[slots] = self.frame_index
+        self.last_update[slots] = self.updates
+
+    def trails(self, slots):
+        """Oldest-first centroid arrays for the given slots that have at least two points"""
+        return [np.roll(self.points[slot], -self.heads[slot], axis=0)[-self.sizes[slot]:]
+                for slot in slots.tolist() if self.sizes[slot] > 1]
+
+    def begin_frame(self, frame_index):
+        self.frame_index = frame_index
+        self.updates += 1
+
+    def end_frame(self):
+        """Free the slots of tracks that have gone away"""
+        stale = np.flatnonzero((self.last_seen >= 0) & (self.updates - self.last_update > self.max_age))
+        for slot in stale.tolist():
+            del self.slot_of[int(self.track_ids[slot])]
+            self.track_ids[slot] = -1
+            self.last_seen[slot] = -1
+            self.free_slots.append(slot)
+
+
+class CountingZones:
+    """A camera's counting zones rasterized once into a label mask, so each centroid's zone is one array lookup
+
+    Zones are drawn in config order, a later zone wins where two overlap. Every track counts once per zone
+    it enters; its first entry zone and the exit zone it reaches after it make up one turning movement.
+    """
+
+    def __init__(self, zone_configs, width, height):
+        self.names = list(zone_configs)
+        if len(self.names) > 63:
+            raise ValueError("At most 63 counting zones per camera")
+        self.mask = np.zeros((height, width), np.uint8)
+        self.is_exit = np.zeros(len(self.names) + 1, bool)  # Indexed by label, 0 is outside every zone
+        self.outlines = []
+        for label, name in enumerate(self.names, start=1):
+            zone = zone_configs[name]
+            points = np.round(np.array(zone['polygon'], float) * [width, height]).astype(np.int32)
+            cv2.fillPoly(self.mask, [points], label)
+            self.outlines.append(points)
+            self.is_exit[label] = zone.get('type', 'entry') == 'exit'
+        self.lane_counts = np.zeros(len(self.names) + 1, np.int64)
+        self.movement_counts = np.zeros((len(self.names) + 1, len(self.names) + 1), np.int64)
+
+    def labels_at(self, centroids):
+        height, width = self.mask.shape
+        return self.mask[np.clip(centroids[:, 1], 0, height - 1), np.clip(centroids[:, 0], 0, width - 1)]
+
+    def update(self, history, slots, centroids):
+        """Count zone entries and completed movements of this frame's tracks, returns (entry, exit, index) arrays"""
+        labels = self.labels_at(centroids).astype(np.int64)
+        inside = labels > 0
+        bits = np.where(inside, np.left_shift(1, np.maximum(labels - 1, 0)), 0)
+        entered = inside & ((history.zones_visited[slots] & bits) == 0)
+        history.zones_visited[slots] |= bits
+        np.add.at(self.lane_counts, labels[entered], 1)
+
+        exits = self.is_exit[labels]
+        first_entry = entered & ~exits & (history.entry_zone[slots] == 0)
+        history.entry_zone[slots[first_entry]] = labels[first_entry]
+        completed = np.flatnonzero(entered & exits & (history.entry_zone[slots] > 0)
+                                   & ~history.movement_counted[slots])
+        entry_labels = history.entry_zone[slots[completed]]
+        np.add.at(self.movement_counts, (entry_labels, labels[completed]), 1)
+        history.movement_counted[slots[completed]] = True
+        return entry_labels, labels[completed], completed
+
+    def get_counts(self):
+        lanes = self.lane_counts.tolist()
+        entries, exits = np.nonzero(self.movement_counts)
+        return {
+            'lanes': {name: lanes[label] for label, name in enumerate(self.names, start=1)},
+            'movements': {f"{self.names[entry - 1]}->{self.names[exit_ - 1]}": int(self.movement_counts[entry, exit_])
+                          for entry, exit_ in zip(entries.tolist(), exits.tolist())}
+        }
+
+
+class MotionGate:
+    """Compares each frame due inference against the last inferred one at low resolution to skip static scenes"""
+
+    def __init__(self, width, height):
+        settings = CONFIG['motion_gate']
+        self.size = (settings['width'], max(1, round(height * settings['width'] / width)))
+        self.pixel_threshold = settings['pixel_threshold']
+        self.min_changed = max(1, int(settings['min_changed_ratio'] * self.size[0] * self.size[1]))
+        self.max_static_frames = settings['max_static_frames']
+        self.reference = None  # Downscaled frame the current detections came from
+        self.reference_index = None
+
+    def downscale(self, frame):
+        """Grayscale thumbnail of a frame, made on the decode thread so the infer thread only compares"""
+        return cv2.cvtColor(cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+    def is_static(self, frame_index, small):
+        """True if the frame can reuse the last detections, otherwise it becomes the new reference"""
+        if self.reference is not None and frame_index - self.reference_index < self.max_static_frames:
+            _, changed = cv2.threshold(cv2.absdiff(small, self.reference), self.pixel_threshold, 255,
+                                       cv2.THRESH_BINARY)
+            if cv2.countNonZero(changed) < self.min_changed:
+                return True
+        self.reference = small
+        self.reference_index = frame_index
+        return False
+
+
+class SegmentedRecorder:
+    """Writes annotated frames of one camera to rotating mp4 segments on its own thread"""
+
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        self.output_dir = os.path.join(CONFIG['recording']['output_dir'], camera_id)
+        self.segment_seconds = CONFIG['recording']['segment_minutes'] * 60
+        self.max_segments = CONFIG['recording']['max_segments']
+        self.queue = None
+        self.thread = None
+        self.active = False
+        self.segments_written = 0
+
+    def start(self, fps, size):
+        if self.active:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.queue = FrameQueue(CONFIG['recording']['queue_size'])
+        self.active = True
+        self.thread = threading.Thread(target=self._write_loop, args=(self.queue, fps, size),
+                                       name=f"{self.camera_id}-recorder", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.active:
+            return
+        self.active = False
+        self.queue.close()
+        self.thread.join(timeout=5)
+
+    def write(self, frame):
+        if self.active:
+            self.queue.put(frame)
+
+    def get_stats(self):
+        return {
+            'active': self.active,
+            'segments_written': self.segments_written,
+            'dropped': self.queue.dropped if self.queue is not None else 0
+        }
+
+    def _open_segment(self, fps, size):
+        path = os.path.join(self.output_dir, f"{self.camera_id}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.mp4")
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(CONFIG['output_path'], fourcc, fps, (width, height))
-        
-        # Initialize tracking variables
-        object_history = defaultdict(list)
-        crossing_status = {}
-        
-        # Reset traffic counts
-        traffic_counts = {
-            'northbound': 0,
-            'southbound': 0,
-            'total': 0
+        self.segments_written += 1
+        self._prune()
+        return cv2.VideoWriter(path, fourcc, fps, size)
+
+    def _prune(self):
+        """Delete the oldest segments so at most max_segments remain, counting the one about to be opened"""
+        segments = sorted(name for name in os.listdir(self.output_dir) if name.endswith('.mp4'))
+        for name in segments[:max(0, len(segments) - self.max_segments + 1)]:
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except OSError as e:
+                print(f"Error removing old recording {name}: {e}")
+
+    def _write_loop(self, queue, fps, size):
+        writer = None
+        segment_started = 0.0
+        try:
+            while True:
+                frame = queue.get(timeout=0.5)
+                if frame is None:
+                    if not self.active:
+                        break
+                    continue
+
+                if writer is None or time.monotonic() - segment_started >= self.segment_seconds:
+                    if writer is not None:
+                        writer.release()
+                    writer = self._open_segment(fps, size)
+                    segment_started = time.monotonic()
+                writer.write(frame)
+        except Exception as e:
+            print(f"Error in {self.camera_id} recorder: {e}")
+            self.active = False
+        finally:
+            if writer is not None:
+                writer.release()
+
+
+class Camera:
+    """One video source with its own decode/annotate threads, tracker state, counts and latest frame"""
+
+    def __init__(self, camera_config, on_frame, history_store=None):
+        self.id = camera_config['id']
+        self.video_path = camera_config['video_path']
+        self.approaches = camera_config.get('approaches', {})
+        self.zone_configs = camera_config.get('zones', {})
+        self.zones = None  # CountingZones, built once the frame size is known
+        self.motion_gate = None  # MotionGate, built once the frame size is known
+        self.cap = None
+        self.recorder = SegmentedRecorder(self.id)
+        self.history_store = history_store  # None keeps counts out of the history, as for benchmark replays
+        self.tracker = None
+        self.threads = []
+        self.stop_event = threading.Event()
+        self.decode_queue = FrameQueue(CONFIG['pipeline']['decode_queue_size'], on_put=on_frame)
+        self.annotate_queue = FrameQueue(CONFIG['pipeline']['annotate_queue_size'])
+        self.counts = new_counts()
+        self.frame_cache = FrameCache(self.id, default_frame)
+        self.broadcaster = get_broadcaster(self.id)
+        self.stats = {
+            'frames_decoded': 0,
+            'frames_inferred': 0,
+            'frames_annotated': 0,
+            'frames_headless': 0,
+            'frames_interpolated': 0,
+            'frames_static': 0,
+            'active_tracks': 0,
+            'emergency_checks': 0,
+            'emergencies': 0
         }
-        
+        self.emergency_classifier = None  # Set by the engine when emergency detection is enabled
+        self.adaptive = None  # The engine's AdaptiveController
+        self.shared_ring = None  # Set when uvicorn workers in other processes serve this camera's frames
+        self.status_overflowed = False
+        self.on_emergency = None  # Called with a preemption event from the infer thread
+
+        # Tracking state, only touched by the engine's infer thread
+        self.history = TrackHistory(CONFIG['history']['max_tracks'],
+                                    CONFIG['history']['length'],
+                                    CONFIG['history']['max_age_updates'])
+        self.last_inferred_index = None
+        self.last_result = None  # Detections reused on frames the motion gate finds static
+        self.motion = None  # Boxes, classes and per-frame velocities from the last inferred frame
+        self.last_trails = []
+        self.arrivals = {direction: deque() for direction in self.approaches}  # Monotonic crossing times
+        self.approach_metrics = {}  # Approach -> latest metrics, replaced whole so readers need no lock
+        self.infer_rate = RateMeter()
+        self.output_rate = RateMeter()
+        self.started_at = None
+        self.first_frame_at = None
+
+        # Bound once here so the hot path never builds label dicts
+        self.decode_seconds = stage_histogram(self.id, 'decode')
+        self.resize_seconds = stage_histogram(self.id, 'resize')
+        self.track_seconds = stage_histogram(self.id, 'track')
+        self.annotate_seconds = stage_histogram(self.id, 'annotate')
+        self.classify_seconds = stage_histogram(self.id, 'classify')
+
+    def open(self):
+        """Open the video source and output writer, returns False if the source is unavailable"""
+        self.cap = cv2.VideoCapture(self.video_path)
+        if not self.cap.isOpened():
+            return False
+
+        # Get video properties
+        original_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        original_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+
+        # Calculate scaled dimensions
+        self.width = int(original_width * CONFIG['frame_scale'])
+        self.height = int(original_height * CONFIG['frame_scale'])
+
         # Calculate counting line position
-        line_y = int(height * CONFIG['counting_line_position'])
-        mid_x = width // 2
-        
-        while cap.isOpened() and not stop_processing:
-            ret, frame = cap.read()
+        self.line_y = int(self.height * CONFIG['counting_line_position'])
+        self.mid_x = self.width // 2
+        if self.zone_configs:
+            self.zones = CountingZones(self.zone_configs, self.width, self.height)
+        if CONFIG['motion_gate']['enabled']:
+            self.motion_gate = MotionGate(self.width, self.height)
+
+        self.tracker = create_tracker(self.fps)
+        # A lost track ByteTrack can still re-find must keep its slot, or it would be counted twice
+        self.history.max_age = max(CONFIG['history']['max_age_updates'], self.tracker.max_time_lost + 1)
+
+        if CONFIG['recording']['enabled']:
+            self.start_recording()
+        return True
+
+    def start_recording(self):
+        self.recorder.start(self.fps, (self.width, self.height))
+
+    def stop_recording(self):
+        self.recorder.stop()
+
+    def is_watched(self):
+        """Whether anyone needs annotated frames: a stream subscriber, a recent poller or a recording"""
+        return (self.broadcaster.has_subscribers()
+                or self.recorder.active
+                or time.monotonic() - self.frame_cache.last_polled < CONFIG['viewer_timeout']
+                or (self.shared_ring is not None and self.shared_ring.is_watched()))
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        for name, target in (('decode', self._decode_loop),
+                             ('annotate', self._annotate_loop)):
+            thread = threading.Thread(target=self._run_stage, args=(name, target),
+                                      name=f"{self.id}-{name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+        self.decode_queue.close()
+        self.annotate_queue.close()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        if self.cap is not None:
+            self.cap.release()
+        self.recorder.stop()
+
+    def is_running(self):
+        return not self.stop_event.is_set()
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            'decode_queue_depth': len(self.decode_queue),
+            'decode_queue_dropped': self.decode_queue.dropped,
+            'annotate_queue_depth': len(self.annotate_queue),
+            'annotate_queue_dropped': self.annotate_queue.dropped,
+            'subscribers': len(self.broadcaster.subscribers),
+            'subscriber_frames_skipped': self.broadcaster.skipped,
+            'frame_seq': self.frame_cache.seq,
+            'jpeg_encodes': self.frame_cache.encodes,
+            'recording': self.recorder.get_stats(),
+            'time_to_first_frame_s': round(self.first_frame_at - self.started_at, 3)
+                                     if self.first_frame_at is not None else None
+        }
+
+    def processing_status(self):
+        return {**self.adaptive.get_status(), **self.get_rates()}
+
+    def zone_counts(self):
+        return self.zones.get_counts() if self.zones is not None else None
+
+    def publish_shared(self, frame, jpeg=None):
+        """Hand the frame, its JPEG if one was encoded and the current counts to the workers' ring"""
+        status = {
+            'counts': self.counts,
+            'zones': self.zone_counts(),
+            'processing': self.processing_status(),
+            'updated_at': time.time()
+        }
+        encoded = json.dumps(status).encode()
+        if len(encoded) > self.shared_ring.status_bytes:
+            if not self.status_overflowed:
+                print(f"Error: {self.id} status of {len(encoded)} bytes is over the shared ring's "
+                      f"{self.shared_ring.status_bytes}, workers get it without zone counts")
+                self.status_overflowed = True
+            encoded = json.dumps({**status, 'zones': None, 'error': 'zone counts too large for the shared ring'}).encode()
+        self.shared_ring.publish(self.frame_cache.seq, frame, jpeg, encoded)
+
+    def get_rates(self):
+        return {
+            'source_fps': round(self.fps, 1),
+            'inference_fps': round(self.infer_rate.rate(), 1),
+            'output_fps': round(self.output_rate.rate(), 1)
+        }
+
+    def _run_stage(self, name, target):
+        try:
+            target()
+        except Exception as e:
+            print(f"Error in {self.id} {name} stage: {e}")
+        finally:
+            # Any stage failing takes the camera down
+            self.stop_event.set()
+            self.decode_queue.close()
+            self.annotate_queue.close()
+
+    def _decode_loop(self):
+        frame_interval = 1.0 / self.fps if CONFIG['pipeline']['realtime'] and self.fps > 0 else 0
+        next_frame_at = time.perf_counter()
+        frame_index = 0
+
+        while not self.stop_event.is_set():
+            started = time.perf_counter()
+            ret, frame = self.cap.read()
             if not ret:
                 # Video ended, loop back to the beginning
-                print("Video ended. Looping...")
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                await asyncio.sleep(0.1) # Brief pause before restarting
-                continue # Continue to the next loop iteration to read the first frame
-            
+                print(f"{self.id}: video ended. Looping...")
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                time.sleep(0.1)  # Brief pause before restarting
+                continue
+            decoded = time.perf_counter()
+            self.decode_seconds.observe(decoded - started)
+
             # Resize frame
-            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
-            
-            # Run YOLO detection with tracking
-            results = model.track(frame, **CONFIG['tracker_config'])
-            
-            if results and results[0].boxes:
-                boxes = results[0].boxes
-                
-                for box in boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    track_id = int(box.id[0]) if box.id is not None else None
-                    class_id = int(box.cls[0])
-                    
-                    if track_id is not None:
-                        # Draw bounding box and label
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        label = f"{CONFIG['class_names'].get(class_id, 'unknown')} {track_id}"
-                        cv2.putText(frame, label, (x1, y1 - 10),
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                        
-                        # Track object position
-                        centroid = (int((x1 + x2)/2), int((y1 + y2)/2))
-                        object_history[track_id].append(centroid)
-                        if len(object_history[track_id]) > 30:
-                            object_history[track_id].pop(0)
-                        
-                        # Determine direction and count
-                        box_center_y = (y1 + y2) // 2
-                        direction = 'northbound' if box_center_y < line_y else 'southbound'
-                        
-                        if track_id not in crossing_status:
-                            crossing_status[track_id] = {'crossed': False}
-                        
-                        if not crossing_status[track_id]['crossed']:
-                            if (y1 <= line_y <= y2):
-                                crossing_status[track_id]['crossed'] = True
-                                traffic_counts[direction] += 1
-                                traffic_counts['total'] += 1
-                        
-                        # Draw trajectory
-                        if len(object_history[track_id]) > 1:
-                            points = np.array(object_history[track_id], np.int32)
-                            cv2.polylines(frame, [points], False, (0, 0, 255), 2)
-            
-            # Add overlay elements
-            cv2.line(frame, (0, line_y), (width, line_y), (0, 255, 255), 2)
-            cv2.line(frame, (mid_x, 0), (mid_x, height), (255, 0, 0), 2)
-            
-            
-            # Update current frame and write to output
-            current_frame = frame
-            out.write(frame)
-            
-            # Control frame rate (yield control to event loop)
-            await asyncio.sleep(0)
-            
+            frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_LINEAR)
+            small = self.motion_gate.downscale(frame) if self.motion_gate is not None else None
+            self.resize_seconds.observe(time.perf_counter() - decoded)
+            # Frames are numbered so later stages can tell how many were skipped or dropped
+            self.decode_queue.put((frame_index, frame, small))
+            frame_index += 1
+            self.stats['frames_decoded'] += 1
+
+            if frame_interval:
+                next_frame_at += frame_interval
+                delay = next_frame_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame_at = time.perf_counter()
+
+    def should_infer(self, frame_index, stride):
+        return self.last_inferred_index is None or frame_index - self.last_inferred_index >= stride
+
+    def is_static(self, frame_index, small):
+        return self.motion_gate is not None and small is not None and self.motion_gate.is_static(frame_index, small)
+
+    def track(self, frame_index, frame, result, inferred=True):
+        """Update this camera's tracker and counts from one detection result, runs on the infer thread"""
+        started = time.perf_counter()
+        self.last_result = result
+        boxes = result.boxes.cpu().numpy()
+        tracks = np.asarray(self.tracker.update(boxes, frame)).reshape(-1, 8)
+
+        # Each track row is x1, y1, x2, y2, track_id, score, class_id, detection index
+        xyxy = tracks[:, :4].astype(np.int32)
+        track_ids = tracks[:, 4].astype(np.int64)
+        class_ids = tracks[:, 6].astype(np.int64)
+        velocity = np.zeros((len(tracks), 2))
+        moving_known = np.zeros(len(tracks), dtype=bool)
+        trails = []
+
+        self.history.begin_frame(frame_index)
+        if len(tracks):
+            # Track object positions
+            centroids = (xyxy[:, :2] + xyxy[:, 2:]) // 2
+            slots = self.history.slots_for(track_ids)
+            previous = self.history.points[slots, (self.history.heads[slots] - 1) % self.history.length]
+            elapsed = frame_index - self.history.last_seen[slots]
+            self.history.append(slots, centroids)
+
+            # Per-frame velocity since each track was last seen, used to move boxes on skipped frames
+            seen = elapsed > 0
+            velocity[seen] = (centroids[seen] - previous[seen]) / elapsed[seen, None]
+            moving_known = seen
+
+            if self.emergency_classifier is not None:
+                self.check_emergencies(frame, xyxy, track_ids, class_ids, slots, centroids, velocity)
+
+            # Count boxes straddling the line for the first time, direction from which side the centre is on
+            line_y = self.line_y
+            crossing = (xyxy[:, 1] <= line_y) & (line_y <= xyxy[:, 3]) & ~self.history.crossed[slots]
+            if crossing.any():
+                self.history.crossed[slots[crossing]] = True
+                is_northbound = centroids[crossing, 1] < line_y
+                crossed_total = int(np.count_nonzero(crossing))
+                northbound = int(np.count_nonzero(is_northbound))
+                self.counts['northbound'] += northbound
+                self.counts['southbound'] += crossed_total - northbound
+                self.counts['total'] += crossed_total
+
+                now = time.time()
+                for north, class_id in zip(is_northbound.tolist(), class_ids[crossing].tolist()):
+                    if self.history_store is not None:
+                        self.history_store.record(self.id, 'northbound' if north else 'southbound', class_id,
+                                                  timestamp=now)
+                    arrivals = self.arrivals.get('northbound' if north else 'southbound')
+                    if arrivals is not None:
+                        arrivals.append(time.monotonic())
+
+            if self.zones is not None:
+                entries, exits, completed = self.zones.update(self.history, slots, centroids)
+                if len(completed) and self.history_store is not None:
+                    now = time.time()
+                    names = self.zones.names
+                    for entry, exit_, class_id in zip(entries.tolist(), exits.tolist(), class_ids[completed].tolist()):
+                        self.history_store.record(self.id, f"{names[entry - 1]}->{names[exit_ - 1]}", class_id,
+                                                  timestamp=now, kind='movements')
+
+            # Trajectories are only needed for the overlay
+            if self.is_watched():
+                trails = self.history.trails(slots)
+
+        self.history.end_frame()
+        if self.approaches:
+            self.approach_metrics = self.measure_approaches(xyxy, class_ids, velocity, moving_known)
+        self.last_inferred_index = frame_index
+        self.motion = (xyxy, track_ids, class_ids, velocity)
+        self.last_trails = trails
+        if inferred:
+            self.stats['frames_inferred'] += 1
+            self.infer_rate.tick()
+        self.stats['active_tracks'] = len(self.history)
+        self.track_seconds.observe(time.perf_counter() - started)
+        self.annotate_queue.put((frame, (xyxy, track_ids, class_ids), trails))
+
+    def check_emergencies(self, frame, xyxy, track_ids, class_ids, slots, centroids, velocity):
+        """Classify the crops of tracks that are due a check, preempt for tracks confirmed as emergency vehicles"""
+        settings = CONFIG['emergency']
+        history = self.history
+        due = (np.isin(class_ids, settings['classes']) & ~history.preempted[slots]
+               & (history.frame_index - history.checked_at[slots] >= settings['check_every']))
+        candidates = np.flatnonzero(due)[:settings['max_crops']]
+        if not len(candidates):
+            return
+
+        started = time.perf_counter()
+        boxes = np.clip(xyxy[candidates], 0, [self.width, self.height, self.width, self.height])
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes.tolist()]
+        scores = self.emergency_classifier.score(crops)
+        self.classify_seconds.observe(time.perf_counter() - started)
+        self.stats['emergency_checks'] += len(candidates)
+
+        candidate_slots = slots[candidates]
+        history.checked_at[candidate_slots] = history.frame_index
+        history.emergency_hits[candidate_slots] = np.where(
+            scores >= settings['min_score'], history.emergency_hits[candidate_slots] + 1, 0)
+        confirmed = np.flatnonzero(history.emergency_hits[candidate_slots] >= settings['confirm_checks'])
+
+        for position in confirmed.tolist():
+            i = int(candidates[position])
+            history.preempted[slots[i]] = True
+            self.stats['emergencies'] += 1
+            # Heading from the track's motion, or for a standing vehicle from which side of the line it waits on
+            if velocity[i, 1] != 0:
+                direction = 'northbound' if velocity[i, 1] < 0 else 'southbound'
+            else:
+                direction = 'northbound' if centroids[i, 1] > self.line_y else 'southbound'
+            approach = self.approaches.get(direction)
+            print(f"{self.id}: emergency vehicle on track {int(track_ids[i])} heading {direction}")
+            if approach is not None and self.on_emergency is not None:
+                self.on_emergency({
+                    'approach': approach,
+                    'camera': self.id,
+                    'track_id': int(track_ids[i]),
+                    'score': round(float(scores[position]), 3),
+                    'detected_at': time.time()
+                })
+
+    def measure_approaches(self, xyxy, class_ids, velocity, moving_known):
+        """Occupancy, queue length and arrival rate of every approach this camera watches"""
+        settings = CONFIG['controller']
+        now = time.monotonic()
+        vehicles = np.isin(class_ids, settings['vehicle_classes'])
+        centre_y = (xyxy[:, 1] + xyxy[:, 3]) // 2
+        area = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+        # New tracks have no velocity yet, they only count as queued once seen standing still
+        queued = moving_known & (np.hypot(velocity[:, 0], velocity[:, 1]) < settings['queue_speed_px'])
+
+        metrics = {}
+        for direction, approach in self.approaches.items():
+            # Northbound vehicles approach the line from below it, southbound ones from above
+            if direction == 'northbound':
+                waiting = vehicles & (centre_y > self.line_y)
+                zone_area = self.width * (self.height - self.line_y)
+            else:
+                waiting = vehicles & (centre_y < self.line_y)
+                zone_area = self.width * self.line_y
+            arrivals = self.arrivals[direction]
+            while arrivals and now - arrivals[0] > settings['arrival_window']:
+                arrivals.popleft()
+            metrics[approach] = {
+                'camera': self.id,
+                'direction': direction,
+                'vehicles': int(np.count_nonzero(waiting)),
+                'queue_length': int(np.count_nonzero(waiting & queued)),
+                'occupancy': round(min(1.0, float(area[waiting].sum()) / zone_area), 3) if zone_area else 0.0,
+                'arrival_rate': round(len(arrivals) * 60.0 / settings['arrival_window'], 1),  # Vehicles per minute
+                'detected_at': time.time()
+            }
+        return metrics
+
+    def interpolate(self, frame_index, frame):
+        """Carry the last tracks over a frame that skips inference by moving each box along its velocity"""
+        if self.motion is None:
+            return
+        xyxy, track_ids, class_ids, velocity = self.motion
+        shift = velocity * (frame_index - self.last_inferred_index)
+        moved = (xyxy + np.hstack([shift, shift])).astype(np.int32)
+        self.stats['frames_interpolated'] += 1
+        self.annotate_queue.put((frame, (moved, track_ids, class_ids), self.last_trails))
+
+    def hold(self, frame_index, frame):
+        """Track a frame the motion gate found static with the last detections instead of running the model
+
+        The tracker still steps: ByteTrack ages lost tracks by its own frame count, so skipping it on
+        static frames makes the counts drift from an ungated run.
+        """
+        self.stats['frames_static'] += 1
+        if self.last_result is not None:
+            self.track(frame_index, frame, self.last_result, inferred=False)
+
+    def draw_overlay(self, frame, detections, trails):
+        """Draw boxes, labels, trajectories and guide lines onto the frame in place"""
+        xyxy, track_ids, class_ids = detections
+        for (x1, y1, x2, y2), track_id, class_id in zip(xyxy.tolist(), track_ids.tolist(), class_ids.tolist()):
+            # Draw bounding box and label
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            label = f"{CONFIG['class_names'].get(class_id, 'unknown')} {track_id}"
+            cv2.putText(frame, label, (x1, y1 - 10),
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+        # Draw trajectories
+        if trails:
+            cv2.polylines(frame, trails, False, (0, 0, 255), 2)
+
+        # Add overlay elements
+        cv2.line(frame, (0, self.line_y), (self.width, self.line_y), (0, 255, 255), 2)
+        cv2.line(frame, (self.mid_x, 0), (self.mid_x, self.height), (255, 0, 0), 2)
+        if self.zones is not None:
+            cv2.polylines(frame, self.zones.outlines, True, (255, 0, 255), 2)
+
+    def _annotate_loop(self):
+        while not self.stop_event.is_set():
+            item = self.annotate_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            frame, detections, trails = item
+            if self.first_frame_at is None:
+                self.first_frame_at = time.perf_counter()
+                print(f"{self.id}: first frame {self.first_frame_at - self.started_at:.2f}s after start")
+
+            if not self.is_watched():
+                # Headless: keep the raw frame around for the next viewer, skip drawing and encoding
+                self.frame_cache.update(frame)
+                self.stats['frames_headless'] += 1
+                self.output_rate.tick()
+                if self.shared_ring is not None:
+                    self.publish_shared(frame)
+                continue
+
+            started = time.perf_counter()
+            self.draw_overlay(frame, detections, trails)
+            self.annotate_seconds.observe(time.perf_counter() - started)
+
+            # Update current frame and hand it to the recorder
+            self.frame_cache.update(frame)
+            self.recorder.write(frame)
+            self.stats['frames_annotated'] += 1
+            self.output_rate.tick()
+
+            # Encode once here and share the bytes with every stream subscriber and poller
+            if self.broadcaster.has_subscribers():
+                self.broadcaster.publish(self.frame_cache.get_jpeg()[1])
+            if self.shared_ring is not None:
+                # Workers only need the JPEG while one of them has a viewer, a local recording alone does not
+                self.publish_shared(frame, self.frame_cache.get_jpeg()[1] if self.shared_ring.is_watched() else None)
+
+
+class ProcessingEngine:
+    """Camera registry plus a single infer thread that batches frames from every camera into one model call"""
+
+    def __init__(self, model, camera_configs, emergency_classifier=None, history_store=None):
+        self.model = model
+        self.frame_ready = threading.Event()
+        self.cameras = {cfg['id']: Camera(cfg, on_frame=self.frame_ready.set, history_store=history_store)
+                        for cfg in camera_configs}
+        self.adaptive = AdaptiveController()
+        for camera in self.cameras.values():
+            camera.emergency_classifier = emergency_classifier
+            camera.adaptive = self.adaptive
+        self.stop_event = threading.Event()
+        self.infer_thread = None
+        self.infer_seconds = stage_histogram('all', 'infer')
+        self.stats = {
+            'batches': 0,
+            'frames_inferred': 0,
+            'last_batch_size': 0,
+            'infer_ms': 0.0
+        }
+
+    def open(self):
+        """Open every camera, dropping the ones whose source is unavailable"""
+        for camera_id, camera in list(self.cameras.items()):
+            if not camera.open():
+                print(f"Error: Could not open video source for {camera_id}")
+                del self.cameras[camera_id]
+        return bool(self.cameras)
+
+    def start(self):
+        for camera in self.cameras.values():
+            camera.start()
+        self.infer_thread = threading.Thread(target=self._infer_loop, name="engine-infer", daemon=True)
+        self.infer_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.frame_ready.set()
+        if self.infer_thread is not None:
+            self.infer_thread.join(timeout=5)
+        for camera in self.cameras.values():
+            camera.stop()
+
+    def is_running(self):
+        return not self.stop_event.is_set() and any(c.is_running() for c in self.cameras.values())
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            **self.adaptive.get_status(),
+            'motion_gate': self.motion_gate_stats(),
+            'cameras': {camera_id: camera.get_stats() for camera_id, camera in self.cameras.items()}
+        }
+
+    def motion_gate_stats(self):
+        """Share of frames due inference that the motion gate kept off the model, and the model time that saved"""
+        static = sum(camera.stats['frames_static'] for camera in self.cameras.values())
+        inferred = self.stats['frames_inferred']
+        # Estimated from the mean model time of the frames that did go through it
+        per_frame = self.infer_seconds.sum / inferred if inferred else 0.0
+        return {
+            'enabled': CONFIG['motion_gate']['enabled'],
+            'frames_static': static,
+            'static_pct': round(100.0 * static / (static + inferred), 1) if static + inferred else 0.0,
+            'infer_seconds_saved': round(static * per_frame, 2)
+        }
+
+    def _collect_batch(self):
+        """Take at most one frame due inference from each camera, interpolating the pending frames before it
+
+        Frames due inference still skip it when the motion gate finds them static.
+        """
+        batch = []
+        for camera in self.cameras.values():
+            if len(batch) >= CONFIG['pipeline']['max_batch_size']:
+                break
+            # In-between frames are cheap, drain them all so none waits for the next decode to be picked up
+            while True:
+                item = camera.decode_queue.get(timeout=0)
+                if item is None:
+                    break
+                frame_index, frame, small = item
+                if not camera.should_infer(frame_index, self.adaptive.stride):
+                    camera.interpolate(frame_index, frame)
+                elif camera.is_static(frame_index, small):
+                    camera.hold(frame_index, frame)
+                else:
+                    batch.append((camera, frame_index, frame))
+                    break
+        # The flag was cleared before collecting, raise it again for whatever is still queued
+        if any(len(camera.decode_queue) for camera in self.cameras.values()):
+            self.frame_ready.set()
+        return batch
+
+    def _infer_loop(self):
+        kwargs = predict_kwargs()
+        # The tightest source sets how often the shared batch has to run
+        frame_interval_ms = min(1000.0 / camera.fps if camera.fps > 0 else 1000.0 / 30
+                                for camera in self.cameras.values())
+        try:
+            while not self.stop_event.is_set():
+                if not self.frame_ready.wait(timeout=0.5):
+                    continue
+                self.frame_ready.clear()
+                batch = self._collect_batch()
+                if not batch:
+                    continue
+
+                # Run YOLO detection on all cameras at once, tracking is applied per camera afterwards
+                started = time.perf_counter()
+                results = self.model.predict([frame for _, _, frame in batch], verbose=False,
+                                             imgsz=self.adaptive.inference_size, **kwargs)
+                elapsed = time.perf_counter() - started
+                self.infer_seconds.observe(elapsed)
+                self.stats['infer_ms'] = elapsed * 1000
+                self.stats['batches'] += 1
+                self.stats['frames_inferred'] += len(batch)
+                self.stats['last_batch_size'] = len(batch)
+                self.adaptive.update(self.stats['infer_ms'], frame_interval_ms)
+
+                for (camera, frame_index, frame), result in zip(batch, results):
+                    camera.track(frame_index, frame, result)
+        except Exception as e:
+            print(f"Error in infer stage: {e}")
+            self.stop_event.set()
+
+class ControllerPublisher:
+    """Pushes the approach metrics of every camera to the signal controller, batched into one request per interval"""
+
+    def __init__(self, cameras):
+        self.cameras = cameras
+        self.settings = CONFIG['controller']
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.push_seconds = metrics.histogram('traffico_controller_push_seconds',
+                                              'Round trip of approach metric pushes to the signal controller')
+        self.preempt_seconds = metrics.histogram('traffico_preempt_push_seconds',
+                                                 'Round trip of emergency preemptions to the signal controller')
+        self.preemptions = SimpleQueue()
+        self.stats = {
+            'pushes': 0,
+            'failures': 0,
+            'replans': 0,
+            'last_error': None,
+            'last_push_ms': None,
+            'preemptions_sent': 0,
+            'preemption_failures': 0,
+            'last_preemption': None
+        }
+
+    def start(self):
+        # Preemptions get their own thread so a slow metrics push never holds one back
+        self.threads = [
+            threading.Thread(target=self._push_loop, name="controller-push", daemon=True),
+            threading.Thread(target=self._preempt_loop, name="controller-preempt", daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.preemptions.put(None)  # Wake the preemption loop
+        for thread in self.threads:
+            thread.join(timeout=5)
+
+    def get_stats(self):
+        return {'url': self.settings['url'], **self.stats}
+
+    def preempt(self, event):
+        """Queue an emergency preemption, it goes out at once on the preemption thread"""
+        self.preemptions.put(event)
+
+    def _push_loop(self):
+        while not self.stop_event.wait(self.settings['interval']):
+            self.push()
+
+    def _preempt_loop(self):
+        while not self.stop_event.is_set():
+            event = self.preemptions.get()
+            if event is not None:
+                self.send_preemption(event)
+
+    def _post(self, url, payload):
+        request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.settings['timeout']) as response:
+            return json.load(response)
+
+    def send_preemption(self, event):
+        started = time.perf_counter()
+        try:
+            reply = self._post(self.settings['preempt_url'], {'intersection': self.settings['intersection'], **event})
+        except Exception as e:
+            self.stats['preemption_failures'] += 1
+            print(f"Could not send emergency preemption to {self.settings['preempt_url']}: {e}")
+            return
+        self.preempt_seconds.observe(time.perf_counter() - started)
+        self.stats['preemptions_sent'] += 1
+        self.stats['last_preemption'] = {**event, 'reply': reply}
+
+    def push(self):
+        approaches = [
+            {**values, 'approach': approach}
+            for camera in self.cameras.values()
+            for approach, values in camera.approach_metrics.items()
+        ]
+        if not approaches:
+            return
+        started = time.perf_counter()
+        try:
+            reply = self._post(self.settings['url'], {
+                'intersection': self.settings['intersection'],
+                'sent_at': time.time(),
+                'approaches': approaches
+            })
+        except Exception as e:
+            self.stats['failures'] += 1
+            if self.stats['last_error'] is None:
+                # Report once, the controller may simply not be running
+                print(f"Could not push approach metrics to {self.settings['url']}: {e}")
+            self.stats['last_error'] = str(e)
+            return
+
+        elapsed = time.perf_counter() - started
+        if self.stats['last_error'] is not None:
+            print(f"Approach metrics reach {self.settings['url']} again")
+            self.stats['last_error'] = None
+        self.push_seconds.observe(elapsed)
+        self.stats['pushes'] += 1
+        self.stats['last_push_ms'] = round(elapsed * 1000, 2)
+        if reply.get('replanned'):
+            self.stats['replans'] += 1
+
+async def process_video():
+    """Main video processing function"""
+    global engine, publisher
+    stats_block = None
+
+    try:
+        # Loaded and warmed up once per process, later runs reuse it; off the event loop either way
+        model, emergency_classifier = await asyncio.to_thread(model_pool.get)
+
+        engine = ProcessingEngine(model, CONFIG['cameras'], emergency_classifier,
+                                  history_store=get_history_store())
+        if not await asyncio.to_thread(engine.open):
+            print("Error: Could not open any video source")
+            return
+        if frame_writer:
+            for camera in engine.cameras.values():
+                camera.shared_ring = SharedFrameRing.create(
+                    camera.id, camera.height, camera.width, camera.frame_cache.epoch,
+                    SharedFrameRing.status_bytes_for(list(camera.zone_configs)))
+            stats_block = SharedStatsBlock.create()
+        if CONFIG['controller']['enabled']:
+            publisher = ControllerPublisher(engine.cameras)
+            for camera in engine.cameras.values():
+                camera.on_emergency = publisher.preempt
+            publisher.start()
+        engine.start()
+
+        # The engine runs on its own threads, just wait here so HTTP stays responsive
+        shared_at = 0.0
+        while not stop_processing and engine.is_running():
+            if stats_block is not None and time.monotonic() - shared_at >= CONFIG['serving']['stats_interval']:
+                shared_at = time.monotonic()
+                publish_shared_stats(stats_block)
+            await asyncio.sleep(0.1)
+
     except Exception as e:
         print(f"Error in video processing: {e}")
     finally:
-        if 'cap' in locals():
-            cap.release()
-        if 'out' in locals():
-            out.release()
+        if publisher is not None:
+            await asyncio.to_thread(publisher.stop)
+            publisher = None
+        if engine is not None:
+            await asyncio.to_thread(engine.stop)
+            for camera in engine.cameras.values():
+                if camera.shared_ring is not None:
+                    camera.shared_ring.close()
+                    camera.shared_ring = None
+        if stats_block is not None:
+            stats_block.close()
 
-@app.get("/")
-async def root():
-    return {"message": "TrafficO - Video Processing API is running"}
+def get_camera(camera_id=None):
+    """Look up a running camera, defaulting to the first configured one"""
+    if camera_id is None:
+        camera_id = CONFIG['cameras'][0]['id']
+    if engine is not None and camera_id in engine.cameras:
+        return engine.cameras[camera_id]
+    if any(cfg['id'] == camera_id for cfg in CONFIG['cameras']):
+        return shared_camera(camera_id) if serves_shared_frames() else None
+    raise HTTPException(status_code=404, detail=f"Unknown camera: {camera_id}")
 
-@app.get("/video-feed")
-async def video_feed():
-    global current_frame
-    if current_frame is None:
-        current_frame = default_frame
-    
-    # Convert BGR to RGB (OpenCV uses BGR, web uses RGB)
-    rgb_frame = cv2.cvtColor(current_frame, cv2.COLOR_BGR2RGB)
-    
-    # Encode the frame as JPEG
-    _, buffer = cv2.imencode('.jpg', rgb_frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
-    frame_bytes = buffer.tobytes()
-    
+def traffic_data_response(camera):
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "counts": camera.counts if camera is not None else new_counts(),
+        "zones": camera.zone_counts() if camera is not None else None,
+        "processing": camera.processing_status() if camera is not None else None
+    }
+
+def frame_cache_of(camera):
+    return camera.frame_cache if camera is not None else idle_frame_cache
+
+def video_feed_response(request, camera, quality, scale):
+    cache = frame_cache_of(camera)
+    cache.last_polled = time.monotonic()
+    # Round the scale so arbitrary floats do not each get their own cached variant
+    scale = max(0.01, round(scale, 2))
+
+    # The sequence number identifies the frame, so the ETag is known before encoding anything
+    etag = cache.etag(cache.seq, quality, scale)
     headers = {
-        'Cache-Control': 'no-cache, no-store, must-revalidate',
-        'Pragma': 'no-cache',
-        'Expires': '0',
-        'Content-Type': 'image/jpeg'
+        'Cache-Control': 'no-cache',
+        'ETag': etag
     }
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+
+    seq, frame_bytes = cache.get_jpeg(quality, scale)
+    headers['ETag'] = cache.etag(seq, quality, scale)
     
     return Response(
         content=frame_bytes,
@@ -240,36 +2222,394 @@ async def video_feed():
         headers=headers
     )
 
+def camera_id_or_default(camera_id=None):
+    get_camera(camera_id)  # Raises 404 for unknown cameras
+    return camera_id or CONFIG['cameras'][0]['id']
+
+async def mjpeg_frames(camera_id, quality=90, scale=1.0):
+    """multipart/x-mixed-replace body that pushes every new frame of a camera
+
+    Other variants than the broadcast one take the push as a signal and fetch the frame cache's variant,
+    so thumbnails are encoded once per frame however many of them are open.
+    """
+    broadcaster = get_broadcaster(camera_id)
+    queue = broadcaster.subscribe()
+    default_variant = (quality, scale) == (90, 1.0)
+    try:
+        # Start with the latest frame so the client does not wait for the next one
+        _, frame_bytes = await asyncio.to_thread(frame_cache_of(get_camera(camera_id)).get_jpeg, quality, scale)
+        while True:
+            yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                   + str(len(frame_bytes)).encode() + b"\r\n\r\n" + frame_bytes + b"\r\n")
+            frame_bytes = await queue.get()
+            if not default_variant:
+                _, frame_bytes = await asyncio.to_thread(
+                    frame_cache_of(get_camera(camera_id)).get_jpeg, quality, scale)
+    finally:
+        broadcaster.unsubscribe(queue)
+
+def mjpeg_response(camera_id, quality=90, scale=1.0):
+    return StreamingResponse(
+        mjpeg_frames(camera_id, quality, scale),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        headers={'Cache-Control': 'no-cache, no-store, must-revalidate'}
+    )
+
+async def send_frames(websocket: WebSocket, camera_id):
+    """Push every new frame of a camera as a binary WebSocket message"""
+    await websocket.accept()
+    broadcaster = get_broadcaster(camera_id)
+    queue = broadcaster.subscribe()
+    try:
+        _, frame_bytes = await asyncio.to_thread(frame_cache_of(get_camera(camera_id)).get_jpeg)
+        await websocket.send_bytes(frame_bytes)
+        while True:
+            await websocket.send_bytes(await queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(queue)
+
+def collect_metric_samples():
+    """Counters and gauges read from the engine's existing stats at scrape time"""
+    samples = []
+    if engine is None:
+        return samples
+    samples.append(('traffico_batches_total', 'counter', 'Batched model calls', {}, engine.stats['batches']))
+    samples.append(('traffico_batch_size', 'gauge', 'Frames in the last batched model call', {},
+                    engine.stats['last_batch_size']))
+    samples.append(('traffico_frame_stride', 'gauge', 'Source frames per inference chosen by the adaptive controller',
+                    {}, engine.adaptive.stride))
+    samples.append(('traffico_inference_size', 'gauge', 'Model input size chosen by the adaptive controller',
+                    {}, engine.adaptive.inference_size))
+    for camera_id, camera in engine.cameras.items():
+        labels = {'camera': camera_id}
+        stats = camera.stats
+        samples += [
+            ('traffico_frames_decoded_total', 'counter', 'Frames read from the video source', labels,
+             stats['frames_decoded']),
+            ('traffico_frames_inferred_total', 'counter', 'Frames that went through the detector', labels,
+             stats['frames_inferred']),
+            ('traffico_frames_interpolated_total', 'counter', 'Frames that reused moved boxes instead of inference',
+             labels, stats['frames_interpolated']),
+            ('traffico_frames_static_total', 'counter', 'Frames the motion gate found static and kept off the model',
+             labels, stats['frames_static']),
+            ('traffico_frames_dropped_total', 'counter', 'Frames dropped by a full stage queue',
+             {**labels, 'queue': 'decode'}, camera.decode_queue.dropped),
+            ('traffico_frames_dropped_total', 'counter', 'Frames dropped by a full stage queue',
+             {**labels, 'queue': 'annotate'}, camera.annotate_queue.dropped),
+            ('traffico_queue_depth', 'gauge', 'Items waiting in a stage queue', {**labels, 'queue': 'decode'},
+             len(camera.decode_queue)),
+            ('traffico_queue_depth', 'gauge', 'Items waiting in a stage queue', {**labels, 'queue': 'annotate'},
+             len(camera.annotate_queue)),
+            ('traffico_active_tracks', 'gauge', 'Tracks held in the history ring buffer', labels,
+             len(camera.history)),
+            ('traffico_crossing_status_size', 'gauge', 'Live tracks already counted at the line', labels,
+             int(np.count_nonzero(camera.history.crossed[camera.history.last_seen >= 0]))),
+            ('traffico_stream_subscribers', 'gauge', 'Open MJPEG and WebSocket subscribers', labels,
+             len(camera.broadcaster.subscribers)),
+            ('traffico_jpeg_encodes_total', 'counter', 'JPEG variants encoded', labels, camera.frame_cache.encodes),
+            ('traffico_vehicles_counted_total', 'counter', 'Vehicles counted at the line', labels,
+             camera.counts['total']),
+            ('traffico_emergency_vehicles_total', 'counter', 'Tracks confirmed as emergency vehicles', labels,
+             stats['emergencies'])
+        ]
+        zone_counts = camera.zone_counts()
+        if zone_counts is not None:
+            samples += [('traffico_zone_entries_total', 'counter', 'Tracks that entered a counting zone',
+                         {**labels, 'zone': zone}, count) for zone, count in zone_counts['lanes'].items()]
+            samples += [('traffico_movements_total', 'counter', 'Tracks that went from an entry zone to an exit zone',
+                         {**labels, 'movement': movement}, count)
+                        for movement, count in zone_counts['movements'].items()]
+        for approach, values in camera.approach_metrics.items():
+            approach_labels = {**labels, 'approach': approach}
+            samples += [
+                ('traffico_approach_queue_length', 'gauge', 'Vehicles standing in an approach', approach_labels,
+                 values['queue_length']),
+                ('traffico_approach_occupancy', 'gauge', 'Share of an approach covered by vehicles', approach_labels,
+                 values['occupancy']),
+                ('traffico_approach_arrival_rate', 'gauge', 'Vehicles per minute crossing into the intersection',
+                 approach_labels, values['arrival_rate'])
+            ]
+    return samples
+
+shared_stats_overflowed = False
+
+def publish_shared_stats(stats_block):
+    """Hand the engine's stats and metrics to the workers, which have no engine of their own"""
+    global shared_stats_overflowed
+    try:
+        stats_block.publish({'pipeline': engine_pipeline_stats(), 'samples': collect_metric_samples(),
+                             'histograms': metrics.snapshot(), 'updated_at': time.time()})
+    except ValueError as e:
+        if not shared_stats_overflowed:
+            shared_stats_overflowed = True
+            print(f"Warning: {e}, workers keep the last stats that fit")
+
+async def monitor_event_loop_lag(interval=0.5):
+    """Record how late the loop wakes from a fixed sleep, anything blocking it shows up here"""
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(0.0, time.perf_counter() - expected))
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    if serves_shared_frames():
+        # The engine's series come from the processing process, the event loop lag from this worker
+        shared = await asyncio.to_thread(shared_stats) or {}
+        text = metrics.render(shared.get('samples', []), shared.get('histograms', ()))
+    else:
+        text = metrics.render(collect_metric_samples())
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+@app.get("/")
+async def root():
+    return {"message": "TrafficO - Video Processing API is running"}
+
+@app.get("/traffic-data")
+async def get_traffic_data():
+    """API endpoint to get current traffic counts"""
+    return traffic_data_response(get_camera())
+
+# Polling routes are plain functions so FastAPI runs any JPEG encoding on its threadpool
+def parse_time(value, default):
+    """Epoch seconds or ISO 8601 (a trailing Z is accepted) to epoch seconds"""
+    if value is None:
+        return default
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+def traffic_history_response(camera_id, start, end, bucket):
+    camera_id = camera_id_or_default(camera_id)
+    end = parse_time(end, int(time.time()) + 1)
+    start = parse_time(start, end - 3600)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if (end - start) // bucket > 10000:
+        raise HTTPException(status_code=400, detail="Too many buckets, use a larger bucket")
+    return {
+        "camera": camera_id,
+        "from": start,
+        "to": end,
+        "bucket": bucket,
+        "buckets": get_history_store().query(camera_id, start, end, bucket)
+    }
+
+# Sync routes so SQLite reads happen on the threadpool
+@app.get("/traffic-data/history")
+def get_traffic_history(start: str = Query(None, alias="from"), end: str = Query(None, alias="to"),
+                        bucket: int = Query(60, ge=1), camera: str = None):
+    """Vehicle counts per bucket (seconds) between from and to, per direction and class, plus zone movements"""
+    return traffic_history_response(camera, start, end, bucket)
+
+@app.get("/cameras/{camera_id}/traffic-data/history")
+def get_camera_traffic_history(camera_id: str, start: str = Query(None, alias="from"),
+                               end: str = Query(None, alias="to"), bucket: int = Query(60, ge=1)):
+    return traffic_history_response(camera_id, start, end, bucket)
+
+@app.get("/video-feed")
+def video_feed(request: Request,
+               quality: int = Query(90, ge=10, le=100),
+               scale: float = Query(1.0, gt=0, le=1.0)):
+    return video_feed_response(request, get_camera(), quality, scale)
+
+@app.get("/video-stream")
+async def video_stream(quality: int = Query(90, ge=10, le=100),
+                       scale: float = Query(1.0, gt=0, le=1.0)):
+    """MJPEG stream of the default camera, frames are pushed as soon as they are processed"""
+    return mjpeg_response(camera_id_or_default(), quality, scale)
+
+@app.websocket("/ws/video-feed")
+async def video_feed_ws(websocket: WebSocket):
+    await send_frames(websocket, camera_id_or_default())
+
+@app.get("/cameras")
+async def list_cameras():
+    """API endpoint to list configured cameras and whether they are running"""
+    return {
+        "cameras": [
+            {
+                "id": cfg['id'],
+                "running": camera is not None and camera.is_running()
+            }
+            for cfg, camera in ((cfg, get_camera(cfg['id'])) for cfg in CONFIG['cameras'])
+        ]
+    }
+
+@app.get("/cameras/{camera_id}/traffic-data")
+async def get_camera_traffic_data(camera_id: str):
+    """API endpoint to get current traffic counts for one camera"""
+    return traffic_data_response(get_camera(camera_id))
+
+@app.get("/cameras/{camera_id}/video-feed")
+def camera_video_feed(camera_id: str, request: Request,
+                      quality: int = Query(90, ge=10, le=100),
+                      scale: float = Query(1.0, gt=0, le=1.0)):
+    return video_feed_response(request, get_camera(camera_id), quality, scale)
+
+@app.get("/cameras/{camera_id}/video-stream")
+async def camera_video_stream(camera_id: str,
+                              quality: int = Query(90, ge=10, le=100),
+                              scale: float = Query(1.0, gt=0, le=1.0)):
+    """MJPEG stream of one camera"""
+    return mjpeg_response(camera_id_or_default(camera_id), quality, scale)
+
+@app.websocket("/cameras/{camera_id}/ws")
+async def camera_video_feed_ws(websocket: WebSocket, camera_id: str):
+    if not any(cfg['id'] == camera_id for cfg in CONFIG['cameras']):
+        await websocket.close(code=1008)
+        return
+    await send_frames(websocket, camera_id)
+
+def running_camera(camera_id=None):
+    camera = get_camera(camera_id)
+    if camera is None:
+        raise HTTPException(status_code=409, detail="Video processing is not running")
+    if not isinstance(camera, Camera):
+        raise HTTPException(status_code=409, detail="Recording is controlled by the processing process")
+    return camera
+
+@app.post("/recording/start")
+async def start_recording():
+    """Start recording the default camera to rotating segments"""
+    running_camera().start_recording()
+    return {"message": "Recording started"}
+
+@app.post("/recording/stop")
+async def stop_recording():
+    await asyncio.to_thread(running_camera().stop_recording)
+    return {"message": "Recording stopped"}
+
+@app.post("/cameras/{camera_id}/recording/start")
+async def start_camera_recording(camera_id: str):
+    """Start recording one camera to rotating segments"""
+    running_camera(camera_id).start_recording()
+    return {"message": f"Recording started for {camera_id}"}
+
+@app.post("/cameras/{camera_id}/recording/stop")
+async def stop_camera_recording(camera_id: str):
+    await asyncio.to_thread(running_camera(camera_id).stop_recording)
+    return {"message": f"Recording stopped for {camera_id}"}
+
+@app.get("/pipeline-stats")
+async def get_pipeline_stats():
+    """API endpoint to get batch, queue depth and frame counters of the processing engine"""
+    if serves_shared_frames():
+        shared = await asyncio.to_thread(shared_stats) or {}
+        pipeline = shared.get('pipeline') or engine_pipeline_stats()
+        # A stale block means the processing process stopped or died
+        pipeline['running'] = (pipeline['running'] and
+                               time.time() - shared.get('updated_at', 0) < CONFIG['viewer_timeout'])
+        shared_frames = {camera_id: camera.ring.get_stats() for camera_id, camera in shared_cameras.items()}
+    else:
+        pipeline, shared_frames = engine_pipeline_stats(), None
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "running": pipeline['running'],
+        "stats": pipeline['stats'],
+        "controller": pipeline['controller'],
+        "approaches": pipeline['approaches'],
+        "shared_frames": shared_frames,
+        "startup": pipeline['startup']
+    }
+
+def engine_pipeline_stats():
+    """The parts of /pipeline-stats that only the process running the engine knows"""
+    return {
+        "running": engine is not None and engine.is_running(),
+        "stats": engine.get_stats() if engine is not None else None,
+        "controller": publisher.get_stats() if publisher is not None else None,
+        "approaches": {camera_id: camera.approach_metrics for camera_id, camera in engine.cameras.items()}
+                      if engine is not None else None,
+        "startup": model_pool.timings
+    }
+
+def require_in_process_engine():
+    if serves_shared_frames():
+        raise HTTPException(status_code=409, detail="Video processing runs in its own process with TRAFFICO_WORKERS > 1")
+
 @app.post("/start")
 async def start_processing():
-    global processing_task, stop_processing
-    stop_processing = False
-    processing_task = asyncio.create_task(process_video())
+    require_in_process_engine()
+    if not await start_video_processing():
+        return {"message": "Video processing is already running"}
     return {"message": "Video processing started"}
 
 @app.post("/stop")
-async def stop_processing():
-    global stop_processing
-    stop_processing = True
+async def stop_video_processing():
+    require_in_process_engine()
+    await stop_processing_task()
     return {"message": "Video processing stopped"}
 
 async def start_video_processing():
-    """Start the video processing task"""
-    global processing_task
-    processing_task = asyncio.create_task(process_video())
+    """Start the processing task unless one is running, returns whether it started one
+
+    There is at most one task, and it runs every camera, so no camera is ever processed twice. A run
+    that is still shutting down after /stop is waited for before the next one opens the cameras.
+    """
+    global processing_task, stop_processing
+    async with processing_lock:
+        if processing_task is not None and not processing_task.done():
+            if not stop_processing:
+                return False
+            await processing_task
+        stop_processing = False
+        processing_task = asyncio.create_task(process_video())
+        return True
+
+async def stop_processing_task():
+    global stop_processing
+    async with processing_lock:
+        stop_processing = True
+        if processing_task is not None:
+            await processing_task
+
+def stop_processing_handler(sig, frame):
+    global stop_processing
+    stop_processing = True
+
+def run_processing():
+    """Processing process for multi-worker serving: runs the engine and fills the shared frame rings"""
+    global frame_writer
+    frame_writer = True
+    # process_video closes and unlinks the rings once it sees the flag
+    signal.signal(signal.SIGINT, stop_processing_handler)
+    signal.signal(signal.SIGTERM, stop_processing_handler)
+    asyncio.run(process_video())
 
 def run_server():
     """Run the FastAPI server with video processing"""
-    # Set up signal handler for graceful shutdown
-    signal.signal(signal.SIGINT, signal_handler)
-    
-    # Create event loop and start video processing
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(start_video_processing())
-    
-    # Start the server
+    workers = CONFIG['serving']['workers']
+    if workers > 1:
+        # Only the processing process loads the model; the workers serve its frames from shared memory
+        processor = multiprocessing.Process(target=run_processing, name="traffico-processing")
+        processor.start()
+        try:
+            uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+        finally:
+            processor.terminate()
+            processor.join(timeout=10)
+        return
+
+    # The app's lifespan loads the model and starts processing on uvicorn's own event loop
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
 if __name__ == "__main__":
-    run_server() 
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        # Engine comparison lives in benchmark.py with the rest of the stage timings
+        import benchmark
+        benchmark.main_cli(['--engines', ','.join(INFERENCE_ENGINES), '--pollers', '0', *sys.argv[2:]],
+                           prog="main.py bench")
+    else:
+        run_server() 
\ No newline at end of file
@@ -6,78 +6,34 @@ interface CameraViewerProps {
   onClose: () => void;
 }
 
+const STREAM_URL = 'http://localhost:8000/video-stream';
+const SNAPSHOT_URL = 'http://localhost:8000/video-feed';
+// The panel is a few hundred pixels tall, a half-size frame is plenty and a fraction of the bytes
+const THUMBNAIL_SCALE = 0.5;
+
 export default function CameraViewer({ cameraId, onClose }: CameraViewerProps) {
   const [isPlaying, setIsPlaying] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [streamKey, setStreamKey] = useState(0);
   const imgRef = useRef<HTMLImageElement>(null);
-  const frameInterval = useRef<NodeJS.Timeout | null>(null);
 
   useEffect(() => {
-    const fetchFrame = async () => {
-      try {
-        const response = await fetch('http://localhost:8000/video-feed', {
-          cache: 'no-store',
-          headers: {
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache'
-          }
-        });
-        
-        if (!response.ok) {
-          throw new Error(`Failed to fetch video feed: ${response.status}`);
-        }
-        
-        // Get the image data as a blob
-        const blob = await response.blob();
-        
-        // Create a URL for the blob
-        const url = URL.createObjectURL(blob);
-        
-        if (imgRef.current) {
-          // Clean up previous URL
-          if (imgRef.current.src) {
-            URL.revokeObjectURL(imgRef.current.src);
-          }
-          
-          // Create a new image element to preload
-          const img = new Image();
-          img.onload = () => {
-            if (imgRef.current) {
-              imgRef.current.src = url;
-              setIsLoading(false);
-            }
-          };
-          img.onerror = () => {
-            setError('Failed to load image');
-            setIsLoading(false);
-          };
-          img.src = url;
-        }
-      } catch (err) {
-        setError(err instanceof Error ? err.message : 'Failed to load video feed');
-        console.error('Error fetching video feed:', err);
-        setIsLoading(false);
-      }
-    };
+    const img = imgRef.current;
+    if (!img) return;
 
-    if (isPlaying) {
-      // Initial fetch
-      fetchFrame();
-      // Fetch a new frame every 50ms (for ~20 FPS)
-      frameInterval.current = setInterval(fetchFrame, 50);
-    }
+    setIsLoading(true);
+    // The backend pushes frames over one long-lived MJPEG response instead of us polling
+    // for every frame. When paused, show a single snapshot and close the stream.
+    img.src = isPlaying
+      ? `${STREAM_URL}?scale=${THUMBNAIL_SCALE}&session=${streamKey}`
+      : `${SNAPSHOT_URL}?scale=${THUMBNAIL_SCALE}&t=${Date.now()}`;
 
     return () => {
-      if (frameInterval.current) {
-        clearInterval(frameInterval.current);
-      }
-      // Clean up any remaining object URLs
-      if (imgRef.current?.src) {
-        URL.revokeObjectURL(imgRef.current.src);
-      }
+      // Dropping the src closes the stream connection
+      img.removeAttribute('src');
     };
-  }, [isPlaying]);
+  }, [isPlaying, streamKey]);
 
   return (
     <div className="relative w-full h-full bg-slate-900 rounded-lg overflow-hidden">
@@ -88,7 +44,7 @@ export default function CameraViewer({ cameraId, onClose }: CameraViewerProps) {
           <button
             onClick={() => {
               setError(null);
-              setIsLoading(true);
+              setStreamKey(key => key + 1);
             }}
             className="mt-4 px-4 py-2 bg-red-500 text-white rounded hover:bg-red-600"
           >
@@ -106,7 +62,11 @@ export default function CameraViewer({ cameraId, onClose }: CameraViewerProps) {
             ref={imgRef}
             alt="Camera Feed"
             className="w-full h-full object-contain"
-            onError={() => setError('Failed to load image')}
+            onLoad={() => setIsLoading(false)}
+            onError={() => {
+              setError('Failed to load video feed');
+              setIsLoading(false);
+            }}
           />
           <div className="absolute bottom-4 right-4 flex space-x-2">
             <button
@@ -116,13 +76,7 @@ export default function CameraViewer({ cameraId, onClose }: CameraViewerProps) {
               {isPlaying ? <PauseCircle size={20} /> : <Video size={20} />}
             </button>
             <button
-              onClick={() => {
-                if (imgRef.current) {
-                  URL.revokeObjectURL(imgRef.current.src);
-                  imgRef.current.src = '';
-                  setIsLoading(true);
-                }
-              }}
+              onClick={() => setStreamKey(key => key + 1)}
               className="p-2 bg-slate-800/70 rounded-full text-slate-300 hover:text-white"
             >
               <RefreshCw size={20} />
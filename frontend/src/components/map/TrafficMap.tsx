@@ -108,7 +108,7 @@ const trafficCameras = [
     lat: 37.340066, 
     lng: -121.882437, 
     name: "Main Intersection Camera",
-    feedUrl: "http://localhost:8000/video-feed"
+    feedUrl: "http://localhost:8000/video-stream"
   },
   { 
     id: 2,
@@ -240,7 +240,6 @@ export default function TrafficMap({ followEmergency = false, onCameraSelect }:
   const selectedCamera = trafficCameras.find(cam => cam.id === selectedCameraId);
   const videoStream = useVideoStream({
     url: selectedCamera?.feedUrl || '',
-    refreshRate: 33,
   });
 
   // Stop video processing when component unmounts
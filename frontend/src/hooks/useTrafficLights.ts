@@ -30,11 +30,25 @@ const endpoints = {
   east: 'http://localhost:5052/east'
 };
 
+// The controller pushes every light change on this Server-Sent Events stream;
+// the REST endpoints above are only polled while the stream is unavailable.
+const STREAM_URL = 'http://localhost:5054/events';
+const INTERSECTION = 'main';
+
+interface LightStateEvent {
+  intersection: string;
+  timestamp: string;
+  lights: Record<string, { color: LightColor; turn_color: LightColor }>;
+}
+
 export function useTrafficLights(refreshInterval: number = 2000) {
   const [status, setStatus] = useState<TrafficLightStatus>(fallbackLights);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
+    let interval: ReturnType<typeof setInterval> | null = null;
+    let source: EventSource | null = null;
+
     const fetchStatus = async () => {
       const results: Partial<Record<keyof typeof endpoints, LightColor>> = {};
       let fetchErrors: string[] = [];
@@ -79,14 +93,46 @@ export function useTrafficLights(refreshInterval: number = 2000) {
       }
     };
 
-    // Initial fetch
-    fetchStatus();
+    const startPolling = () => {
+      if (interval) return;
+      fetchStatus();
+      interval = setInterval(fetchStatus, refreshInterval);
+    };
 
-    // Set up polling
-    const interval = setInterval(fetchStatus, refreshInterval);
+    const stopPolling = () => {
+      if (interval) clearInterval(interval);
+      interval = null;
+    };
 
-    // Cleanup interval on unmount
-    return () => clearInterval(interval);
+    if (typeof EventSource === 'undefined') {
+      startPolling();
+    } else {
+      source = new EventSource(STREAM_URL);
+      source.onmessage = (event) => {
+        const data: LightStateEvent = JSON.parse(event.data);
+        if (data.intersection !== INTERSECTION) return;
+        // The stream is (back) up, no need to poll
+        stopPolling();
+        setStatus({
+          timestamp: data.timestamp,
+          lights: {
+            north: data.lights.north?.color ?? 'unknown',
+            south: 'unknown', // South remains unknown
+            east: data.lights.east?.color ?? 'unknown',
+            west: data.lights.west?.color ?? 'unknown',
+          }
+        });
+        setError(null);
+      };
+      // EventSource reconnects by itself; poll until it delivers again
+      source.onerror = startPolling;
+    }
+
+    // Cleanup stream and polling on unmount
+    return () => {
+      source?.close();
+      stopPolling();
+    };
 
   }, [refreshInterval]);
 
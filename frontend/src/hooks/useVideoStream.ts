@@ -1,55 +1,44 @@
-import { useState, useEffect, useRef } from 'react';
+import { useState, useEffect } from 'react';
 
 interface UseVideoStreamProps {
   url: string;
-  refreshRate?: number;
 }
 
 // Fallback video source for offline mode
 const FALLBACK_VIDEO_SRC = '/images/offline-camera-feed.jpg';
 
-export function useVideoStream({ url, refreshRate = 30 }: UseVideoStreamProps) {
+// `url` is an MJPEG stream: the backend pushes frames over a single response,
+// so the returned src can be used directly as an <img> source without polling.
+export function useVideoStream({ url }: UseVideoStreamProps) {
   const [videoSrc, setVideoSrc] = useState<string>(FALLBACK_VIDEO_SRC);
   const [isOffline, setIsOffline] = useState(false);
-  const intervalRef = useRef<NodeJS.Timeout>();
 
   useEffect(() => {
-    const updateVideo = async () => {
-      try {
-        if (!url) {
-          setVideoSrc(FALLBACK_VIDEO_SRC);
-          setIsOffline(true);
-          return;
-        }
+    if (!url) {
+      setVideoSrc(FALLBACK_VIDEO_SRC);
+      setIsOffline(true);
+      return;
+    }
 
-        const response = await fetch(url);
-        if (!response.ok) throw new Error('Failed to fetch video feed');
-        
-        const blob = await response.blob();
-        const objectUrl = URL.createObjectURL(blob);
-        setVideoSrc(objectUrl);
+    // Probe the stream once: the response headers are enough to know it is live,
+    // then abort so this check does not hold a second connection open.
+    const controller = new AbortController();
+    fetch(url, { signal: controller.signal, cache: 'no-store' })
+      .then(response => {
+        if (!response.ok) throw new Error('Failed to open video stream');
+        setVideoSrc(url);
         setIsOffline(false);
-      } catch (error) {
-        console.error('Error fetching video feed:', error);
+        controller.abort();
+      })
+      .catch(error => {
+        if (controller.signal.aborted) return;
+        console.error('Error opening video stream:', error);
         setVideoSrc(FALLBACK_VIDEO_SRC);
         setIsOffline(true);
-      }
-    };
-
-    // Initial update
-    updateVideo();
+      });
 
-    // Set up polling
-    if (url) {
-      intervalRef.current = setInterval(updateVideo, 1000 / refreshRate);
-    }
-
-    return () => {
-      if (intervalRef.current) {
-        clearInterval(intervalRef.current);
-      }
-    };
-  }, [url, refreshRate]);
+    return () => controller.abort();
+  }, [url]);
 
   return { videoSrc, isOffline };
-} 
\ No newline at end of file
+}